@@ -0,0 +1,356 @@
+"""Encrypted file attachments stored as independently encrypted chunks.
+
+Contract:
+- add_attachment(user_id, key, name, stream, entry_id=None, db_path=None) -> int
+- open_attachment(user_id, key, attachment_id, db_path=None) -> AttachmentReader
+- export_attachment(user_id, key, attachment_id, out, db_path=None) -> int  # bytes written
+- list_attachments(user_id, key, entry_id=None, db_path=None) -> list[dict]
+- delete_attachment(user_id, attachment_id, db_path=None) -> bool
+- check_attachments(user_id, key, attachment_ids=None, db_path=None) -> list[tuple[int, str]]  # failures
+- reencrypt_attachments(user_id, old_key, new_key, conn, attachment_ids=None) -> int  # on master password change
+- mark_rekeyed(conn, user_id, old_verifier) / previous_verifier(user_id, db_path=None) -> str | None
+
+Notes
+-----
+- Files are read and written ATTACHMENT_CHUNK_SIZE bytes at a time, so memory
+  use does not depend on the file size.
+- Each chunk is AES-GCM encrypted with a subkey of the user's key
+  (`crypto.chunk_cipher`). The associated data binds it to its user, attachment,
+  index and whether it is the last chunk, so chunks cannot be swapped, reordered
+  or dropped without failing authentication. The `size`, `chunk_size` and
+  `chunk_count` columns are not authenticated themselves: they must agree with
+  each other and with the length of every decrypted chunk, or reading fails.
+- `AttachmentReader` is a seekable binary file object that fetches and decrypts
+  only the chunks covering the requested range (random access).
+- Data lives in `attachment_chunks`; listing the vault or the attachments never
+  reads it. The file name is stored as a Fernet token.
+- `reencrypt_attachments` runs inside the caller's transaction and does not
+  commit, so a master password change can re-key entries, attachments and the
+  verifier atomically (see `VaultSession.set_master_password`). Callers run
+  `check_attachments` first so a corrupt chunk aborts before anything changes.
+- Attachments do not sync. When a sync replaces a user's verifier (the master
+  password changed on a peer), `app.sync` calls `mark_rekeyed` with the old
+  verifier: the local attachments are still under the key it validates.
+"""
+from __future__ import annotations
+
+import io
+import sqlite3
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+from . import config, crypto
+from .config import get_db_path
+from .storage import Database
+
+
+def _connect(db_path: Optional[Database] = None) -> sqlite3.Connection:
+    if isinstance(db_path, sqlite3.Connection):
+        return db_path
+    return sqlite3.connect(db_path or get_db_path())
+
+
+def _aad(user_id: int, attachment_id: int, idx: int, final: bool) -> bytes:
+    return f"{user_id}:{attachment_id}:{idx}:{int(final)}".encode("ascii")
+
+
+def _expected_count(size: int, chunk_size: int) -> int:
+    return max(1, -(-size // chunk_size))
+
+
+def _check_layout(size: int, chunk_size: int, chunk_count: int) -> None:
+    if chunk_size <= 0 or size < 0 or chunk_count != _expected_count(size, chunk_size):
+        raise ValueError("Attachment metadata does not match its chunks")
+
+
+def _check_length(data: bytes, size: int, chunk_size: int, idx: int) -> None:
+    # Every chunk but the last is full; together they add up to `size`
+    if len(data) != min(chunk_size, size - idx * chunk_size):
+        raise ValueError(f"Attachment chunk {idx} has the wrong length")
+
+
+def _read_full(stream: BinaryIO, size: int) -> bytes:
+    parts = []
+    remaining = size
+    while remaining:
+        data = stream.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
+
+def add_attachment(
+    user_id: int,
+    key: bytes,
+    name: str,
+    stream: BinaryIO,
+    entry_id: Optional[int] = None,
+    db_path: Optional[Database] = None,
+    chunk_size: int = config.ATTACHMENT_CHUNK_SIZE,
+) -> int:
+    """Encrypt `stream` chunk by chunk into the database and return the attachment id."""
+    if not name:
+        raise ValueError("name is required")
+    cipher = crypto.chunk_cipher(key)
+    with _connect(db_path) as conn:
+        cur = conn.execute(
+            "INSERT INTO attachments (user_id, entry_id, name, size, chunk_size, chunk_count, created_at)"
+            " VALUES (?, ?, ?, 0, ?, 0, ?)",
+            (user_id, entry_id, crypto.encrypt(name, key), chunk_size, int(time.time())),
+        )
+        attachment_id = int(cur.lastrowid)
+        size = idx = 0
+        data = _read_full(stream, chunk_size)
+        while True:
+            # Read one chunk ahead to know whether the current one is the last
+            following = _read_full(stream, chunk_size) if len(data) == chunk_size else b""
+            final = not following
+            conn.execute(
+                "INSERT INTO attachment_chunks (attachment_id, idx, data) VALUES (?, ?, ?)",
+                (attachment_id, idx, crypto.encrypt_chunk(cipher, data, _aad(user_id, attachment_id, idx, final))),
+            )
+            size += len(data)
+            idx += 1
+            if final:
+                break
+            data = following
+        conn.execute(
+            "UPDATE attachments SET size = ?, chunk_count = ? WHERE id = ?", (size, idx, attachment_id)
+        )
+        conn.commit()
+    return attachment_id
+
+
+class AttachmentReader(io.RawIOBase):
+    """Seekable, read-only view of a decrypted attachment."""
+
+    def __init__(self, user_id: int, key: bytes, attachment_id: int, db_path: Optional[Path] = None):
+        super().__init__()
+        self._conn = _connect(db_path)
+        row = self._conn.execute(
+            "SELECT name, size, chunk_size, chunk_count FROM attachments WHERE id = ? AND user_id = ?",
+            (attachment_id, user_id),
+        ).fetchone()
+        if row is None:
+            self._conn.close()
+            raise ValueError("Attachment not found")
+        self.name = crypto.decrypt(row[0], key)
+        self.size, self.chunk_size, self.chunk_count = int(row[1]), int(row[2]), int(row[3])
+        try:
+            _check_layout(self.size, self.chunk_size, self.chunk_count)
+        except ValueError:
+            self._conn.close()
+            raise
+        self._user_id = user_id
+        self._attachment_id = attachment_id
+        self._cipher = crypto.chunk_cipher(key)
+        self._pos = 0
+        self._cached_idx = -1
+        self._cached = b""
+
+    def _chunk(self, idx: int) -> bytes:
+        if idx != self._cached_idx:
+            row = self._conn.execute(
+                "SELECT data FROM attachment_chunks WHERE attachment_id = ? AND idx = ?",
+                (self._attachment_id, idx),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Attachment chunk {idx} is missing")
+            aad = _aad(self._user_id, self._attachment_id, idx, idx == self.chunk_count - 1)
+            data = crypto.decrypt_chunk(self._cipher, bytes(row[0]), aad)
+            _check_length(data, self.size, self.chunk_size, idx)
+            self._cached, self._cached_idx = data, idx
+        return self._cached
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self.size}[whence]
+        if base + offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = base + offset
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        if self._pos >= self.size:
+            return 0
+        idx, offset = divmod(self._pos, self.chunk_size)
+        data = self._chunk(idx)[offset:offset + len(buffer)]
+        if not data and len(buffer):
+            raise ValueError(f"Attachment chunk {idx} is short")
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to `size` bytes (all remaining if negative), crossing chunks as needed."""
+        end = self.size if size is None or size < 0 else min(self.size, self._pos + size)
+        parts = []
+        while self._pos < end:
+            idx, offset = divmod(self._pos, self.chunk_size)
+            data = self._chunk(idx)[offset:offset + end - self._pos]
+            if not data:
+                raise ValueError(f"Attachment chunk {idx} is short")
+            parts.append(data)
+            self._pos += len(data)
+        return b"".join(parts)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._conn.close()
+        super().close()
+
+
+def open_attachment(user_id: int, key: bytes, attachment_id: int, db_path: Optional[Path] = None) -> AttachmentReader:
+    return AttachmentReader(user_id, key, attachment_id, db_path)
+
+
+def export_attachment(user_id: int, key: bytes, attachment_id: int, out: BinaryIO, db_path: Optional[Path] = None) -> int:
+    """Decrypt an attachment into `out`, one chunk at a time."""
+    written = 0
+    with open_attachment(user_id, key, attachment_id, db_path) as reader:
+        for idx in range(reader.chunk_count):
+            written += out.write(reader._chunk(idx))
+    return written
+
+
+def list_attachments(user_id: int, key: bytes, entry_id: Optional[int] = None, db_path: Optional[Database] = None) -> List[Dict[str, object]]:
+    """Attachment metadata only; chunk data is never read."""
+    with _connect(db_path) as conn:
+        if entry_id is None:
+            cur = conn.execute(
+                "SELECT id, entry_id, name, size, created_at FROM attachments WHERE user_id = ? ORDER BY id DESC",
+                (user_id,),
+            )
+        else:
+            cur = conn.execute(
+                "SELECT id, entry_id, name, size, created_at FROM attachments WHERE user_id = ? AND entry_id = ?"
+                " ORDER BY id DESC",
+                (user_id, entry_id),
+            )
+        result: List[Dict[str, object]] = []
+        for row in cur.fetchall():
+            try:
+                name = crypto.decrypt(row[2], key)
+            except Exception:
+                name = "<unable to decrypt>"
+            result.append({"id": row[0], "entry_id": row[1], "name": name, "size": row[3], "created_at": row[4]})
+        return result
+
+
+def delete_attachment(user_id: int, attachment_id: int, db_path: Optional[Database] = None) -> bool:
+    with _connect(db_path) as conn:
+        cur = conn.execute("DELETE FROM attachments WHERE id = ? AND user_id = ?", (attachment_id, user_id))
+        if cur.rowcount:
+            conn.execute("DELETE FROM attachment_chunks WHERE attachment_id = ?", (attachment_id,))
+        conn.commit()
+        return cur.rowcount > 0
+
+
+def check_attachments(
+    user_id: int, key: bytes, attachment_ids: Optional[Sequence[int]] = None, db_path: Optional[Database] = None
+) -> List[Tuple[int, str]]:
+    """Decrypt the name and every chunk of each attachment and check their lengths against
+    the stored size; return (attachment_id, error) failures."""
+    cipher = crypto.chunk_cipher(key)
+    failures = []
+    conn = _connect(db_path)
+    try:
+        if attachment_ids is None:
+            rows = conn.execute(
+                "SELECT id, name, size, chunk_size, chunk_count FROM attachments WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        else:
+            placeholders = ",".join("?" * len(attachment_ids))
+            rows = conn.execute(
+                "SELECT id, name, size, chunk_size, chunk_count FROM attachments"
+                f" WHERE user_id = ? AND id IN ({placeholders})",
+                (user_id, *attachment_ids),
+            ).fetchall()
+        for attachment_id, name, size, chunk_size, chunk_count in rows:
+            try:
+                crypto.decrypt(name, key)
+                _check_layout(size, chunk_size, chunk_count)
+                for idx in range(chunk_count):
+                    row = conn.execute(
+                        "SELECT data FROM attachment_chunks WHERE attachment_id = ? AND idx = ?", (attachment_id, idx)
+                    ).fetchone()
+                    if row is None:
+                        raise ValueError(f"Attachment chunk {idx} is missing")
+                    data = crypto.decrypt_chunk(cipher, bytes(row[0]), _aad(user_id, attachment_id, idx, idx == chunk_count - 1))
+                    _check_length(data, size, chunk_size, idx)
+            except Exception as ex:
+                failures.append((attachment_id, type(ex).__name__))
+    finally:
+        # A borrowed connection may be inside the caller's transaction: leave it alone
+        if conn is not db_path:
+            conn.close()
+    return sorted(failures)
+
+
+def reencrypt_attachments(
+    user_id: int, old_key: bytes, new_key: bytes, conn: sqlite3.Connection, attachment_ids: Optional[Sequence[int]] = None
+) -> int:
+    """Re-encrypt the attachments of a user (all, or `attachment_ids`) under a new key, one chunk at a time.
+
+    Runs in the caller's transaction on `conn`; the caller commits or rolls back.
+    """
+    old_cipher, new_cipher = crypto.chunk_cipher(old_key), crypto.chunk_cipher(new_key)
+    count = 0
+    rows = conn.execute("SELECT id, name, chunk_count FROM attachments WHERE user_id = ?", (user_id,)).fetchall()
+    if attachment_ids is not None:
+        wanted = set(attachment_ids)
+        rows = [r for r in rows if r[0] in wanted]
+    for attachment_id, name, chunk_count in rows:
+        for idx in range(chunk_count):
+            aad = _aad(user_id, attachment_id, idx, idx == chunk_count - 1)
+            blob = conn.execute(
+                "SELECT data FROM attachment_chunks WHERE attachment_id = ? AND idx = ?", (attachment_id, idx)
+            ).fetchone()[0]
+            data = crypto.decrypt_chunk(old_cipher, bytes(blob), aad)
+            conn.execute(
+                "UPDATE attachment_chunks SET data = ? WHERE attachment_id = ? AND idx = ?",
+                (crypto.encrypt_chunk(new_cipher, data, aad), attachment_id, idx),
+            )
+        conn.execute(
+            "UPDATE attachments SET name = ? WHERE id = ?",
+            (crypto.encrypt(crypto.decrypt(name, old_key), new_key), attachment_id),
+        )
+        count += 1
+    return count
+
+
+def _rekeyed_meta_key(user_id: int) -> str:
+    return f"attachments-key:{user_id}"
+
+
+def mark_rekeyed(conn: sqlite3.Connection, user_id: int, old_verifier: str) -> None:
+    """Record that the user's key changed under their local attachments (caller's transaction).
+
+    The first recorded verifier is kept: later changes do not touch the attachments either.
+    """
+    if conn.execute("SELECT 1 FROM attachments WHERE user_id = ? LIMIT 1", (user_id,)).fetchone():
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (_rekeyed_meta_key(user_id), old_verifier)
+        )
+
+
+def previous_verifier(user_id: int, db_path: Optional[Database] = None) -> Optional[str]:
+    """Verifier of the key the local attachments are under, if it is no longer the user's key."""
+    with _connect(db_path) as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (_rekeyed_meta_key(user_id),)).fetchone()
+        return row[0] if row else None
+
+
+def clear_rekeyed(conn: sqlite3.Connection, user_id: int) -> None:
+    conn.execute("DELETE FROM meta WHERE key = ?", (_rekeyed_meta_key(user_id),))
@@ -0,0 +1,309 @@
+"""Online, deduplicated snapshot backups of the vault database.
+
+Contract:
+- create_snapshot(db_path=None, backup_dir=None) -> Snapshot
+- list_snapshots(backup_dir=None) -> list[Snapshot]
+- verify_snapshot(snapshot_id, backup_dir=None) -> list[str]  # problems, empty if ok
+- restore_snapshot(snapshot_id, target, backup_dir=None) -> None
+- prune(keep=config.BACKUP_KEEP, backup_dir=None) -> int  # snapshots removed
+
+Layout of the backup directory:
+- chunks/<aa>/<sha256>: zlib-compressed run of BACKUP_CHUNK_PAGES pages
+- snapshots/<id>.json: manifest (page size, file size, ordered chunk hashes)
+
+Notes
+-----
+- The copy uses `sqlite3.Connection.backup` in BACKUP_STEP_PAGES increments, so
+  the running app can keep writing while a snapshot is taken and the copy is
+  always a consistent database (never a torn file).
+- Chunks are content-addressed, so a new snapshot only stores the chunks whose
+  pages changed since any earlier snapshot. Existing chunks are verified before
+  reuse and rewritten if damaged.
+- `create`, `restore` and `prune` hold an exclusive lock on `<backup dir>/.lock`
+  while they touch the chunk store, so `prune` never removes chunks that a
+  concurrent snapshot has just written or decided to reuse.
+- The database holds only Fernet tokens, salts and verifiers; chunks are stored
+  as-is (compressed), with the same sensitivity as `passwords.db` itself.
+
+Run `python -m app.backup --help` for the command-line interface.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import zlib
+from contextlib import closing, contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from . import config
+
+
+@dataclass
+class Snapshot:
+    id: str
+    created_at: str
+    page_size: int
+    size: int
+    chunks: List[str] = field(default_factory=list)
+    new_chunks: int = 0
+
+
+def _backup_dir(backup_dir: Optional[Path]) -> Path:
+    path = Path(backup_dir) if backup_dir is not None else config.BACKUP_DIR
+    (path / "chunks").mkdir(parents=True, exist_ok=True)
+    (path / "snapshots").mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _chunk_path(root: Path, digest: str) -> Path:
+    return root / "chunks" / digest[:2] / digest
+
+
+@contextmanager
+def _store_lock(root: Path) -> Iterator[None]:
+    """Exclusive, cross-process lock on the chunk store."""
+    with open(root / ".lock", "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _online_copy(db_path: Path, dest: Path, step_pages: int) -> None:
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(dest)
+    try:
+        with dst:
+            src.backup(dst, pages=step_pages, sleep=0.005)
+    finally:
+        dst.close()
+        src.close()
+
+
+def create_snapshot(
+    db_path: Optional[Path] = None,
+    backup_dir: Optional[Path] = None,
+    step_pages: int = config.BACKUP_STEP_PAGES,
+    chunk_pages: int = config.BACKUP_CHUNK_PAGES,
+) -> Snapshot:
+    """Take a consistent copy of the live database and store its new chunks."""
+    db_path = Path(db_path) if db_path is not None else config.get_db_path()
+    if not db_path.exists():
+        raise ValueError(f"Database not found: {db_path}")
+    root = _backup_dir(backup_dir)
+    now = datetime.now(timezone.utc)
+    snap = Snapshot(id=now.strftime("%Y%m%dT%H%M%S%fZ"), created_at=now.isoformat(), page_size=0, size=0)
+
+    fd, tmp = tempfile.mkstemp(dir=root, prefix=".copy-", suffix=".db")
+    os.close(fd)
+    try:
+        _online_copy(db_path, Path(tmp), step_pages)
+        # Closed before the file is unlinked (an open file cannot be removed on Windows)
+        with closing(sqlite3.connect(tmp)) as conn:
+            snap.page_size = int(conn.execute("PRAGMA page_size").fetchone()[0])
+        chunk_size = snap.page_size * chunk_pages
+        # Chunks are only referenced once the manifest exists: keep prune out
+        # from the first reuse decision until the manifest is written.
+        with _store_lock(root), open(tmp, "rb") as fh:
+            while True:
+                data = fh.read(chunk_size)
+                if not data:
+                    break
+                snap.size += len(data)
+                digest = hashlib.sha256(data).hexdigest()
+                if not _chunk_ok(root, digest):
+                    _write_atomic(_chunk_path(root, digest), zlib.compress(data))
+                    snap.new_chunks += 1
+                snap.chunks.append(digest)
+            _write_atomic(root / "snapshots" / f"{snap.id}.json", json.dumps(asdict(snap)).encode("utf-8"))
+    finally:
+        os.unlink(tmp)
+    return snap
+
+
+def list_snapshots(backup_dir: Optional[Path] = None) -> List[Snapshot]:
+    """Return snapshots oldest first."""
+    root = _backup_dir(backup_dir)
+    snaps = []
+    for path in sorted((root / "snapshots").glob("*.json")):
+        snaps.append(Snapshot(**json.loads(path.read_text(encoding="utf-8"))))
+    return snaps
+
+
+def _load(snapshot_id: str, root: Path) -> Snapshot:
+    path = root / "snapshots" / f"{snapshot_id}.json"
+    if not path.exists():
+        raise ValueError(f"Snapshot not found: {snapshot_id}")
+    return Snapshot(**json.loads(path.read_text(encoding="utf-8")))
+
+
+def _read_chunk(root: Path, digest: str) -> bytes:
+    try:
+        data = zlib.decompress(_chunk_path(root, digest).read_bytes())
+    except zlib.error:
+        raise ValueError(f"Chunk {digest} is corrupted") from None
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"Chunk {digest} is corrupted")
+    return data
+
+
+def _chunk_ok(root: Path, digest: str) -> bool:
+    # An existing chunk is reused only if it still holds its content; a damaged
+    # one is rewritten instead of being shared by every later snapshot.
+    try:
+        _read_chunk(root, digest)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def verify_snapshot(snapshot_id: str, backup_dir: Optional[Path] = None) -> List[str]:
+    """Check every chunk of a snapshot; return a list of problems (empty if ok)."""
+    root = _backup_dir(backup_dir)
+    snap = _load(snapshot_id, root)
+    problems: List[str] = []
+    sizes: Dict[str, int] = {}
+    for digest in dict.fromkeys(snap.chunks):
+        try:
+            sizes[digest] = len(_read_chunk(root, digest))
+        except FileNotFoundError:
+            problems.append(f"missing chunk {digest}")
+        except ValueError as ex:
+            problems.append(str(ex))
+    size = sum(sizes.get(digest, 0) for digest in snap.chunks)
+    if not problems and size != snap.size:
+        problems.append(f"size mismatch: expected {snap.size}, got {size}")
+    return problems
+
+
+def restore_snapshot(snapshot_id: str, target: Path, backup_dir: Optional[Path] = None) -> None:
+    """Rebuild a snapshot into `target`.
+
+    The file is reassembled and checked with `PRAGMA quick_check` first. An
+    existing target is then overwritten through the sqlite backup API, so other
+    connections to it see a clean switch rather than a half-written file.
+    """
+    root = _backup_dir(backup_dir)
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".restore-", suffix=".db")
+    try:
+        with _store_lock(root), os.fdopen(fd, "wb") as fh:
+            snap = _load(snapshot_id, root)
+            for digest in snap.chunks:
+                fh.write(_read_chunk(root, digest))
+        with closing(sqlite3.connect(tmp)) as conn:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise ValueError(f"Restored database failed integrity check: {result}")
+        if target.exists():
+            _online_copy(Path(tmp), target, config.BACKUP_STEP_PAGES)
+        else:
+            os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def prune(keep: int = config.BACKUP_KEEP, backup_dir: Optional[Path] = None) -> int:
+    """Keep the newest `keep` snapshots and delete chunks no longer referenced."""
+    if keep < 1:
+        raise ValueError("keep must be at least 1")
+    root = _backup_dir(backup_dir)
+    with _store_lock(root):
+        snaps = list_snapshots(root)
+        removed = snaps[:-keep]
+        for snap in removed:
+            (root / "snapshots" / f"{snap.id}.json").unlink()
+        live = {digest for snap in snaps[-keep:] for digest in snap.chunks}
+        for path in (root / "chunks").glob("*/*"):
+            if path.name not in live:
+                path.unlink()
+    return len(removed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.backup", description="Vault snapshot backups")
+    parser.add_argument("--dir", type=Path, default=None, help="backup directory")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_create = sub.add_parser("create", help="take a snapshot")
+    p_create.add_argument("--db", type=Path, default=None)
+    sub.add_parser("list", help="list snapshots")
+    p_verify = sub.add_parser("verify", help="verify a snapshot")
+    p_verify.add_argument("snapshot")
+    p_restore = sub.add_parser("restore", help="verify and restore a snapshot")
+    p_restore.add_argument("snapshot")
+    p_restore.add_argument("target", type=Path)
+    p_prune = sub.add_parser("prune", help="drop old snapshots and unused chunks")
+    p_prune.add_argument("--keep", type=int, default=config.BACKUP_KEEP)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.cmd == "create":
+            snap = create_snapshot(args.db, args.dir)
+            print(f"{snap.id}: {len(snap.chunks)} chunks, {snap.new_chunks} new")
+        elif args.cmd == "list":
+            for snap in list_snapshots(args.dir):
+                print(f"{snap.id}\t{snap.size} bytes\t{len(snap.chunks)} chunks")
+        elif args.cmd == "verify":
+            problems = verify_snapshot(args.snapshot, args.dir)
+            for problem in problems:
+                print(problem)
+            print("ok" if not problems else "FAILED")
+            return 1 if problems else 0
+        elif args.cmd == "restore":
+            problems = verify_snapshot(args.snapshot, args.dir)
+            if problems:
+                print("\n".join(problems))
+                return 1
+            restore_snapshot(args.snapshot, args.target, args.dir)
+            print(f"restored {args.snapshot} to {args.target}")
+        elif args.cmd == "prune":
+            print(f"removed {prune(args.keep, args.dir)} snapshots")
+    except ValueError as ex:
+        print(f"error: {ex}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
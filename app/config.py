@@ -17,11 +17,31 @@ APP_DIR = Path.home() / f".{APP_NAME}"
 DB_FILENAME = "passwords.db"
 
 DB_PATH = APP_DIR / DB_FILENAME
+BACKUP_DIR = APP_DIR / "backups"
 
 # Crypto parameters
 PBKDF2_ITERATIONS = 390_000  # Reasonable default as of 2025
 KEY_LENGTH = 32  # bytes for Fernet (32-byte key after URL-safe base64)
 
+# Attachments: plaintext bytes per independently encrypted chunk
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
+# Startup budget: the "time to first window" of app.startup.profile_startup(), i.e. seconds
+# from importing app.gui to the login window drawn (interpreter start-up not included)
+STARTUP_BUDGET_SECONDS = 1.5
+
+# Login scheduler parameters
+LOGIN_MAX_QUEUE = 32  # logins allowed to wait for a KDF worker before new ones are rejected
+LOGIN_TIMEOUT = 30.0  # seconds a login may wait + run before giving up
+LOGIN_BACKOFF_BASE = 1.0  # seconds; doubles after each consecutive failure per username
+LOGIN_BACKOFF_MAX = 60.0
+LOGIN_MAX_TRACKED = 10_000  # failed usernames remembered for backoff; the oldest are forgotten first
+
+# Backup parameters
+BACKUP_STEP_PAGES = 256  # pages copied per sqlite backup step before yielding to writers
+BACKUP_CHUNK_PAGES = 8  # pages per content-addressed chunk
+BACKUP_KEEP = 24  # snapshots kept by prune()
+
 
 def ensure_app_dirs() -> None:
     """Ensure the application data directory exists."""
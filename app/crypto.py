@@ -3,22 +3,30 @@
 This module exposes minimal, testable functions:
 - derive_key(master_password: str, salt: bytes) -> bytes
 - generate_salt(length: int = 16) -> bytes
-- encrypt(plaintext: str, key: bytes) -> str  # returns Fernet token (base64 str)
-- decrypt(token: str, key: bytes) -> str
+- encrypt(plaintext: str, key: bytes | Fernet) -> str  # returns Fernet token (base64 str)
+- decrypt(token: str, key: bytes | Fernet) -> str
+- cipher(key: bytes) -> Fernet  # reusable cipher, accepted by encrypt/decrypt
+- chunk_cipher(key: bytes) -> AESGCM  # per-user cipher for attachment chunks
+- encrypt_chunk(cipher, data: bytes, aad: bytes) -> bytes / decrypt_chunk(cipher, blob, aad) -> bytes
 
 Notes
 -----
 - We use PBKDF2HMAC with SHA256 and a high iteration count.
 - For storage, callers should persist the salt separately (e.g., in config SALT_PATH).
 - We use Fernet (cryptography.fernet) for authenticated encryption.
+- Attachment chunks use AES-256-GCM with a subkey derived (HKDF) from the user's
+  key, so each chunk is authenticated on its own and bound to its position via
+  the associated data.
 """
 from __future__ import annotations
 
-from base64 import urlsafe_b64encode
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 import os
-from typing import Final
+from typing import Final, Union
 
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.fernet import Fernet, InvalidToken
 
@@ -53,25 +61,50 @@ def derive_key(master_password: str, salt: bytes) -> bytes:
     return urlsafe_b64encode(key)
 
 
-def encrypt(plaintext: str, key: bytes) -> str:
+def cipher(key: bytes) -> Fernet:
+    """Build a Fernet cipher once so callers can reuse it across many tokens."""
+    return Fernet(key)
+
+
+def encrypt(plaintext: str, key: Union[bytes, Fernet]) -> str:
     """Encrypt a plaintext string and return a Fernet token (str)."""
     if not isinstance(plaintext, str):
         raise TypeError("plaintext must be a string")
-    f = Fernet(key)
+    f = key if isinstance(key, Fernet) else Fernet(key)
     token = f.encrypt(plaintext.encode("utf-8"))
     return token.decode("utf-8")
 
 
-def decrypt(token: str, key: bytes) -> str:
+def decrypt(token: str, key: Union[bytes, Fernet]) -> str:
     """Decrypt a Fernet token and return the plaintext string.
 
     Raises InvalidToken if the key is wrong or token is corrupted.
     """
     if not isinstance(token, str):
         raise TypeError("token must be a string")
-    f = Fernet(key)
+    f = key if isinstance(key, Fernet) else Fernet(key)
     try:
         plaintext = f.decrypt(token.encode("utf-8"))
     except InvalidToken:
         raise
     return plaintext.decode("utf-8")
+
+
+CHUNK_NONCE_SIZE: Final = 12
+
+
+def chunk_cipher(key: bytes) -> AESGCM:
+    """Build the AES-GCM cipher for attachment chunks from a Fernet user key."""
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"charly-attachments-v1")
+    return AESGCM(hkdf.derive(urlsafe_b64decode(key)))
+
+
+def encrypt_chunk(cipher: AESGCM, data: bytes, aad: bytes) -> bytes:
+    """Encrypt one chunk; returns nonce + ciphertext + tag."""
+    nonce = os.urandom(CHUNK_NONCE_SIZE)
+    return nonce + cipher.encrypt(nonce, data, aad)
+
+
+def decrypt_chunk(cipher: AESGCM, blob: bytes, aad: bytes) -> bytes:
+    """Decrypt one chunk. Raises InvalidTag if it was altered, moved or truncated."""
+    return cipher.decrypt(blob[:CHUNK_NONCE_SIZE], blob[CHUNK_NONCE_SIZE:], aad)
@@ -1,22 +1,36 @@
 from __future__ import annotations
 
+import threading
 import tkinter as tk
 from tkinter import ttk
 from typing import Optional
 
 from .login import LoginFrame
-from .vault import VaultFrame
-from .register import RegisterFrame
+
+
+def _warm_up() -> None:
+    # Load crypto, storage and the remaining frames while the user types.
+    # Failures are ignored here; the real import reports them when needed.
+    try:
+        from .. import services  # noqa: F401
+        from . import register, vault  # noqa: F401
+    except Exception:
+        pass
 
 
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self, warm_up: bool = True):
         super().__init__()
         self.title("Charly Password Manager")
         self.geometry("720x480")
 
         self.current_frame: Optional[ttk.Frame] = None
         self.show_login()
+        if warm_up:
+            self.after_idle(self._start_warm_up)
+
+    def _start_warm_up(self):
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
 
     def set_frame(self, frame: ttk.Frame):
         if self.current_frame is not None:
@@ -28,7 +42,11 @@ class App(tk.Tk):
         self.set_frame(LoginFrame(self, on_login=self.show_vault))
 
     def show_vault(self, user_id: int, key: bytes):
+        from .vault import VaultFrame
+
         self.set_frame(VaultFrame(self, user_id, key))
 
     def show_register(self):
+        from .register import RegisterFrame
+
         self.set_frame(RegisterFrame(self, on_registered=self.show_vault))
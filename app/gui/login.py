@@ -3,8 +3,6 @@ from __future__ import annotations
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from .. import services
-
 
 class LoginFrame(ttk.Frame):
     def __init__(self, master: tk.Tk, on_login):
@@ -36,6 +34,9 @@ class LoginFrame(ttk.Frame):
         if not user or not pw:
             messagebox.showwarning("Campos requeridos", "Por favor ingrese usuario y contraseña")
             return
+        # Imported here so the login window does not wait for the crypto stack
+        from .. import services
+
         try:
             user_id, key = services.login(user, pw)
         except Exception as ex:
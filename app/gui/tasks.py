@@ -0,0 +1,127 @@
+"""Background task runner for Tk frames.
+
+Work (DB and crypto) runs on a worker thread; results, errors and progress come
+back through a queue that the Tk main thread polls with `after()`, so callbacks
+always run on the main thread and never touch Tk from a worker.
+
+Usage:
+    runner = TaskRunner(frame)
+    runner.submit(lambda task: services.list_passwords(uid, key),
+                  on_success=render, tag="refresh")
+
+- The function receives the Task; long jobs may call `task.progress(done, total)`
+  and check `task.cancelled`.
+- Submitting a task with the same `tag` as a pending one cancels the older one:
+  it is skipped if not started yet and its result is discarded otherwise. Only
+  tag idempotent reads such as refreshes; writes are submitted untagged.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+POLL_MS = 50
+
+
+class Task:
+    def __init__(self, fn: Callable[["Task"], Any], on_success=None, on_error=None, on_progress=None, tag: Optional[str] = None):
+        self.fn = fn
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.tag = tag
+        self._cancelled = threading.Event()
+        self._queue: Optional[queue.Queue] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def progress(self, done: int, total: int) -> None:
+        """Report progress from the worker; delivered to on_progress on the main thread."""
+        if self._queue is not None and self.on_progress is not None:
+            self._queue.put((self, "progress", (done, total)))
+
+
+class TaskRunner:
+    def __init__(self, widget, max_workers: int = 1):
+        # One worker by default keeps DB writes and the refreshes after them in order
+        self.widget = widget
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._queue: queue.Queue = queue.Queue()
+        self._pending = 0
+        self._latest: Dict[str, Task] = {}
+        self._polling = False
+        self._closed = False
+
+    def submit(self, fn: Callable[[Task], Any], on_success=None, on_error=None, on_progress=None, tag: Optional[str] = None) -> Task:
+        if self._closed:
+            raise RuntimeError("TaskRunner is shut down")
+        task = Task(fn, on_success, on_error, on_progress, tag)
+        task._queue = self._queue
+        if tag is not None:
+            previous = self._latest.get(tag)
+            if previous is not None:
+                previous.cancel()
+            self._latest[tag] = task
+        self._pending += 1
+        self._executor.submit(self._run, task)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(POLL_MS, self._poll)
+        return task
+
+    def _run(self, task: Task) -> None:
+        if task.cancelled:
+            self._queue.put((task, "cancelled", None))
+            return
+        try:
+            result = task.fn(task)
+        except Exception as ex:
+            self._queue.put((task, "error", ex))
+        else:
+            self._queue.put((task, "success", result))
+
+    def _poll(self) -> None:
+        if self._closed:
+            return
+        while True:
+            try:
+                task, kind, value = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                if not task.cancelled:
+                    task.on_progress(*value)
+                continue
+            self._pending -= 1
+            if task.tag is not None and self._latest.get(task.tag) is task:
+                del self._latest[task.tag]
+            if task.cancelled:
+                continue
+            callback = task.on_success if kind == "success" else task.on_error
+            if callback is not None:
+                callback(value)
+            elif kind == "error":
+                traceback.print_exception(type(value), value, value.__traceback__)
+        if self._pending > 0:
+            self.widget.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    @property
+    def busy(self) -> bool:
+        return self._pending > 0
+
+    def shutdown(self) -> None:
+        """Cancel pending work and stop delivering results (e.g. when the frame is destroyed)."""
+        self._closed = True
+        for task in self._latest.values():
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -3,21 +3,27 @@ from __future__ import annotations
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 
-from .. import services
+from ..session import VaultSession
+from .tasks import TaskRunner
 
 
 class VaultFrame(ttk.Frame):
     def __init__(self, master: tk.Tk, user_id: int, key: bytes):
         super().__init__(master)
         self.user_id = user_id
-        self.key = key
+        # Owns the connection, cipher and caches for as long as the frame lives;
+        # opened on the worker like any other DB work (see _open_session)
+        self.session = None
+        self._destroyed = False
+        # DB and crypto work runs off the Tk main thread
+        self.tasks = TaskRunner(self)
+        self._items = []
 
         # Toolbar
         bar = ttk.Frame(self)
         bar.pack(fill=tk.X)
         # User info
-        info = services.get_user_profile(self.user_id) or {"full_name": "", "email": "", "username": ""}
-        self.user_label = ttk.Label(bar, text=f"Usuario: {info['full_name']} <{info['email']}>".strip())
+        self.user_label = ttk.Label(bar, text="Usuario:")
         self.user_label.pack(side=tk.LEFT, padx=6)
 
         ttk.Button(bar, text="Agregar", command=self.add_item).pack(side=tk.LEFT, padx=4, pady=4)
@@ -27,7 +33,8 @@ class VaultFrame(ttk.Frame):
         self.btn_show_hide.pack(side=tk.LEFT, padx=4, pady=4)
         self.btn_change_entry = ttk.Button(bar, text="Cambiar Contraseña", command=self._change_selected_password, state=tk.DISABLED)
         self.btn_change_entry.pack(side=tk.LEFT, padx=4, pady=4)
-        ttk.Button(bar, text="Cambiar Clave Maestra", command=self.change_password).pack(side=tk.RIGHT, padx=4, pady=4)
+        self.btn_change_master = ttk.Button(bar, text="Cambiar Clave Maestra", command=self.change_password)
+        self.btn_change_master.pack(side=tk.RIGHT, padx=4, pady=4)
         ttk.Button(bar, text="Cerrar Sesión", command=self.logout).pack(side=tk.RIGHT, padx=4, pady=4)
 
         # Treeview
@@ -43,6 +50,14 @@ class VaultFrame(ttk.Frame):
         hint = ttk.Label(self, text="Selecciona una fila y usa Mostrar/Ocultar o Cambiar contraseña. También puedes clic derecho para más opciones.")
         hint.pack(fill=tk.X, padx=6, pady=(2, 6))
 
+        # Status line: progress of background work
+        status = ttk.Frame(self)
+        status.pack(fill=tk.X, padx=6, pady=(0, 6))
+        self.status_label = ttk.Label(status, text="")
+        self.status_label.pack(side=tk.LEFT)
+        self.progress = ttk.Progressbar(status, mode="indeterminate", length=160)
+        self.progress.pack(side=tk.RIGHT)
+
         # Track entries whose password is shown (default is masked)
         self._shown_ids = set()
         self.tree.bind("<Button-3>", self._on_context_menu)
@@ -51,17 +66,80 @@ class VaultFrame(ttk.Frame):
         # Update action buttons when selection changes
         self.tree.bind("<<TreeviewSelect>>", self._on_selection_changed)
 
+        self._set_busy("Abriendo bóveda…")
+        # Tasks run in submission order on one worker, so actions submitted
+        # before the session is open still find it
+        self.tasks.submit(
+            lambda task: self._open_session(user_id, key),
+            on_success=self._on_session_opened,
+            on_error=self._error("Error al abrir la bóveda"),
+        )
+
+    def _open_session(self, user_id: int, key: bytes):
+        # Runs on the worker. destroy() may run meanwhile: whichever of the two
+        # sees the other's write closes the session (closing twice is harmless).
+        session = VaultSession(user_id, key)
+        self.session = session
+        if self._destroyed:
+            session.close(wait=False)
+        return session
+
+    def _on_session_opened(self, _session):
+        self.tasks.submit(lambda task: self.session.get_user_profile(), on_success=self._show_profile)
         self.refresh()
 
+    def destroy(self):
+        self._destroyed = True
+        self.tasks.shutdown()
+        if self.session is not None:
+            # Does not wait for a running task: the session is marked closed now
+            # and its connection and key are released once that task returns
+            self.session.close(wait=False)
+        super().destroy()
+
+    def _show_profile(self, info):
+        info = info or {"full_name": "", "email": "", "username": ""}
+        self.user_label.configure(text=f"Usuario: {info['full_name']} <{info['email']}>".strip())
+
+    def _error(self, message: str):
+        def show(ex):
+            self._set_idle()
+            messagebox.showerror("Error", f"{message}: {ex}")
+        return show
+
+    def _set_busy(self, text: str):
+        self.status_label.configure(text=text)
+        self.progress.configure(mode="indeterminate", value=0)
+        self.progress.start(10)
+
+    def _set_progress(self, done: int, total: int):
+        self.progress.stop()
+        self.progress.configure(mode="determinate", maximum=max(total, 1), value=done)
+
+    def _set_idle(self):
+        self.progress.stop()
+        self.progress.configure(mode="determinate", value=0)
+        self.status_label.configure(text="")
+
     def refresh(self):
+        # A newer refresh supersedes (cancels) any pending one
+        self._set_busy("Cargando…")
+        self.tasks.submit(
+            lambda task: self.session.list_passwords(),
+            on_success=self._on_items_loaded,
+            on_error=self._error("Error al listar contraseñas"),
+            tag="refresh",
+        )
+
+    def _on_items_loaded(self, items):
+        self._items = items
+        self._set_idle()
+        self._render()
+
+    def _render(self):
         for i in self.tree.get_children():
             self.tree.delete(i)
-        try:
-            items = services.list_passwords(self.user_id, self.key)
-        except Exception as ex:
-            messagebox.showerror("Error", f"Error al listar contraseñas: {ex}")
-            return
-        for it in items:
+        for it in self._items:
             pwd = it["password"]
             if pwd == "<unable to decrypt>":
                 pwd_display = pwd
@@ -81,12 +159,11 @@ class VaultFrame(ttk.Frame):
         password = simpledialog.askstring("Contraseña", "Ingrese la contraseña", show="*")
         if password is None:
             return
-        try:
-            services.add_password(self.user_id, self.key, site, username, password)
-        except Exception as ex:
-            messagebox.showerror("Error", f"Error al agregar: {ex}")
-            return
-        self.refresh()
+        self.tasks.submit(
+            lambda task: self.session.add_password(site, username, password),
+            on_success=lambda _: self.refresh(),
+            on_error=self._error("Error al agregar"),
+        )
 
     def delete_selected(self):
         sel = self.tree.selection()
@@ -96,19 +173,22 @@ class VaultFrame(ttk.Frame):
         entry_id = int(values[0])
         if not messagebox.askyesno("Confirmar", "¿Eliminar la entrada seleccionada?"):
             return
-        ok = services.delete_password(self.user_id, entry_id)
-        if not ok:
-            messagebox.showwarning("No encontrado", "Entrada no eliminada")
-        self.refresh()
+
+        def done(ok):
+            if not ok:
+                messagebox.showwarning("No encontrado", "Entrada no eliminada")
+            self.refresh()
+
+        self.tasks.submit(
+            lambda task: self.session.delete_password(entry_id),
+            on_success=done,
+            on_error=self._error("Error al eliminar"),
+        )
 
     def logout(self):
         if not messagebox.askyesno("Confirmar", "¿Volver al inicio de sesión?"):
             return
-        try:
-            # Best-effort: clear key reference
-            self.key = b""
-        except Exception:
-            pass
+        # The session (connection, key, caches) is released when the frame is destroyed
         # Delegate navigation to the App controller
         if hasattr(self.master, "show_login"):
             self.master.show_login()
@@ -146,7 +226,7 @@ class VaultFrame(ttk.Frame):
             self._shown_ids.remove(entry_id)
         else:
             self._shown_ids.add(entry_id)
-        self.refresh()
+        self._render()
 
     def _change_selected_password(self):
         entry_id = self._get_selected_entry()
@@ -155,12 +235,11 @@ class VaultFrame(ttk.Frame):
         new_pw = simpledialog.askstring("Cambiar Contraseña", "Ingrese la nueva contraseña", show='*')
         if not new_pw:
             return
-        try:
-            services.update_password(self.user_id, self.key, entry_id, new_pw)
-        except Exception as ex:
-            messagebox.showerror("Error", f"Error al actualizar contraseña: {ex}")
-            return
-        self.refresh()
+        self.tasks.submit(
+            lambda task: self.session.update_password(entry_id, new_pw),
+            on_success=lambda _: self.refresh(),
+            on_error=self._error("Error al actualizar contraseña"),
+        )
 
     def change_password(self):
         old_pw = simpledialog.askstring("Contraseña Anterior", "Ingrese la contraseña anterior", show='*')
@@ -175,9 +254,23 @@ class VaultFrame(ttk.Frame):
         if new_pw != new_pw2:
             messagebox.showwarning("Error de confirmación", "Las contraseñas no coinciden")
             return
-        try:
-            services.change_master_password(self.user_id, old_pw, new_pw)
-        except Exception as ex:
-            messagebox.showerror("Error", f"Error al cambiar contraseña: {ex}")
-            return
-        messagebox.showinfo("Éxito", "Contraseña maestra actualizada")
+
+        def done(_):
+            self.btn_change_master.configure(state=tk.NORMAL)
+            self._set_idle()
+            messagebox.showinfo("Éxito", "Contraseña maestra actualizada")
+
+        def failed(ex):
+            self.btn_change_master.configure(state=tk.NORMAL)
+            self._error("Error al cambiar contraseña")(ex)
+
+        # Not tagged: a re-key must never be superseded. The button stays
+        # disabled until it finishes so it cannot be queued twice.
+        self.btn_change_master.configure(state=tk.DISABLED)
+        self._set_busy("Re-cifrando bóveda…")
+        self.tasks.submit(
+            lambda task: self.session.change_master_password(old_pw, new_pw, progress=task.progress),
+            on_success=done,
+            on_error=failed,
+            on_progress=self._set_progress,
+        )
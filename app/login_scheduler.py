@@ -0,0 +1,216 @@
+"""Bounded KDF worker pool with admission control for concurrent logins.
+
+Contract:
+- LoginScheduler(max_workers=None, max_queue=config.LOGIN_MAX_QUEUE, ...)
+- LoginScheduler.login(username, master_password, db_path=None) -> tuple[int, bytes]
+- LoginScheduler.metrics() -> dict
+- LoginScheduler.shutdown()  # also usable as a context manager
+- get_scheduler() -> LoginScheduler  # process-wide default, used by VaultSession.login
+
+Notes
+-----
+- Key derivations run on a process pool sized to the CPU count, so a burst of
+  logins cannot run more PBKDF2 instances than there are cores.
+- At most `max_workers + max_queue` derivations are in flight; further ones fail
+  fast with LoginBusyError instead of piling up. A slot is released only when
+  its pool job actually finishes or is cancelled, so timed-out jobs still
+  queued or running in the pool keep counting. Together with `timeout` this
+  bounds the worst-case unlock latency; timed-out requests are included in the
+  latency percentiles.
+- After a failed login the username (per database) is locked out for an
+  exponentially growing delay (LoginThrottledError). Unknown usernames are
+  throttled the same way. A username is forgotten once it has been quiet for
+  twice `backoff_max`, and at most `max_tracked` are remembered (oldest failure
+  dropped first), so random usernames cannot grow the table without bound.
+- If a pool worker dies (e.g. killed by the OOM killer) the pool is broken for
+  good; the scheduler then replaces it, so only the logins in flight fail.
+- Both errors subclass ValueError, like the errors of `services.login`.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from . import config, crypto, storage
+
+
+class LoginBusyError(ValueError):
+    """Too many logins are already queued."""
+
+
+class LoginThrottledError(ValueError):
+    """The username failed recently and is in backoff."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _percentile(values: Deque[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LoginScheduler:
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: int = config.LOGIN_MAX_QUEUE,
+        timeout: float = config.LOGIN_TIMEOUT,
+        backoff_base: float = config.LOGIN_BACKOFF_BASE,
+        backoff_max: float = config.LOGIN_BACKOFF_MAX,
+        executor: Optional[Executor] = None,
+        db_path: Optional[Path] = None,
+        max_tracked: int = config.LOGIN_MAX_TRACKED,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.db_path = db_path
+        self.max_tracked = max_tracked
+        self._executor = executor or ProcessPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # (db path, username) -> (failures, locked until, last failure), oldest failure first
+        self._failures: Dict[Tuple[str, str], Tuple[int, float, float]] = {}
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "throttled": 0, "timeouts": 0, "pool_restarts": 0}
+
+    def __enter__(self) -> "LoginScheduler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _check_backoff(self, username: Tuple[str, str]) -> None:
+        entry = self._failures.get(username)
+        if entry is None:
+            return
+        remaining = entry[1] - time.monotonic()
+        if remaining > 0:
+            self._counters["throttled"] += 1
+            raise LoginThrottledError(f"Too many failed attempts, retry in {remaining:.0f}s", remaining)
+
+    def _record_failure(self, username: Tuple[str, str]) -> None:
+        with self._lock:
+            now = time.monotonic()
+            count = self._failures.pop(username, (0, 0.0, 0.0))[0] + 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (count - 1))
+            self._failures[username] = (count, now + delay, now)
+            self._counters["failed"] += 1
+            # Entries are ordered by last failure, so expired ones are at the front
+            while self._failures:
+                who, (_, _, last) = next(iter(self._failures.items()))
+                if len(self._failures) <= self.max_tracked and last + 2 * self.backoff_max >= now:
+                    break
+                del self._failures[who]
+
+    def _replace_broken_executor(self, broken: Executor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._counters["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def derive_key(self, master_password: str, salt: bytes) -> bytes:
+        """Run one key derivation through the pool, honoring admission limits."""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise LoginBusyError("Too many logins in progress, try again later")
+            self._in_flight += 1
+        start = time.monotonic()
+        executor = self._executor
+        try:
+            try:
+                future = executor.submit(crypto.derive_key, master_password, salt)
+            except BrokenProcessPool:
+                self._replace_broken_executor(executor)
+                executor = self._executor
+                future = executor.submit(crypto.derive_key, master_password, salt)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the pool is really done with the job, even if
+        # this caller gives up waiting for it.
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise TimeoutError("Login timed out waiting for a key derivation worker") from None
+        except BrokenProcessPool:
+            self._replace_broken_executor(executor)
+            raise ValueError("Key derivation worker crashed, try again") from None
+        finally:
+            with self._lock:
+                self._latencies.append(time.monotonic() - start)
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def login(self, username: str, master_password: str, db_path: Optional[Path] = None) -> Tuple[int, bytes]:
+        """Same contract as `services.login`, scheduled on the pool."""
+        path = db_path or self.db_path or config.get_db_path()
+        who = (str(path), username)
+        with self._lock:
+            self._check_backoff(who)
+        storage.ensure_db(path)
+        user = storage.get_user_by_username(username, path)
+        if user is None:
+            self._record_failure(who)
+            raise ValueError("User not found")
+        key = self.derive_key(master_password, user["salt"])
+        try:
+            if crypto.decrypt(user["verifier"], key) != "verification":
+                raise ValueError("Invalid master password")
+        except Exception as ex:
+            self._record_failure(who)
+            raise ValueError("Invalid master password") from ex
+        with self._lock:
+            self._failures.pop(who, None)
+            self._counters["completed"] += 1
+        return int(user["id"]), key
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, counters and recent latency percentiles (seconds)."""
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.max_workers),
+                "workers": self.max_workers,
+                **self._counters,
+                "latency_p50": _percentile(self._latencies, 50),
+                "latency_p95": _percentile(self._latencies, 95),
+                "latency_p99": _percentile(self._latencies, 99),
+            }
+
+
+_default: Optional[LoginScheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> LoginScheduler:
+    """Shared scheduler for this process; pool workers start on the first login."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = LoginScheduler()
+        return _default
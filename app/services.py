@@ -5,14 +5,19 @@ High-level contract:
 - register_user(username: str, full_name: str, email: str, master_password: str) -> tuple[int, bytes]
 - login(username: str, master_password: str) -> tuple[int, bytes]
 - get_user_profile(user_id: int) -> dict | None
-- change_master_password(user_id: int, old_password: str, new_password: str) -> None
+- change_master_password(user_id: int, old_password: str, new_password: str, progress=None) -> None
 - add_password(user_id: int, key: bytes, site: str, username: str, password: str) -> int
 - list_passwords(user_id: int, key: bytes) -> list[dict]
+- find_by_url(user_id: int, url: str, key: bytes | None = None, match_domain: bool = False) -> list[dict]
 - delete_password(user_id: int, entry_id: int) -> bool
+- verify_vault(user_id: int, key: bytes, incremental: bool = False) -> verify.VerifyReport
 
 Notes
 -----
-- Salt is stored in a file at SALT_PATH.
+- These functions are thin, stateless wrappers kept for compatibility: each call
+  opens a short-lived `app.session.VaultSession` on the default database. Code
+  that performs several operations should keep a VaultSession instead.
+- Salt is stored per user in the `users` table.
 - The `users.verifier` stores an encrypted constant using the derived key to validate the master password.
 - Changing salt breaks decryption; salt is created once and reused.
 """
@@ -20,9 +25,10 @@ from __future__ import annotations
 
 from dataclasses import asdict
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 
-from . import config, crypto, storage
+from . import config, crypto, storage, verify
+from .session import VaultSession
 
 
 def _load_or_create_salt() -> bytes:
@@ -44,42 +50,13 @@ def is_registered() -> bool:
     return storage.get_user_by_id(1) is not None
 
 
-def _derive_user_key(master_password: str, salt: bytes) -> bytes:
-    return crypto.derive_key(master_password, salt)
-
-
 def register_user(username: str, full_name: str, email: str, master_password: str) -> Tuple[int, bytes]:
-    config.ensure_app_dirs()
-    storage.init_db()
-    if not username or len(username) < 3:
-        raise ValueError("Username must be at least 3 characters")
-    if storage.get_user_by_username(username) is not None:
-        raise ValueError("Username already exists")
-    # Password policy: min length 12, must include upper, lower, digit
-    if len(master_password) < 12 or not any(c.islower() for c in master_password) or not any(c.isupper() for c in master_password) or not any(c.isdigit() for c in master_password):
-        raise ValueError("Password must be 12+ chars with upper, lower, digit")
-    salt = crypto.generate_salt(16)
-    key = _derive_user_key(master_password, salt)
-    verifier = crypto.encrypt("verification", key)
-    user_id = storage.create_user(username=username, full_name=full_name, email=email, salt=salt, verifier=verifier)
-    return user_id, key
+    with VaultSession.register(username, full_name, email, master_password) as session:
+        return session.user_id, session.key
 
 def login(username: str, master_password: str) -> Tuple[int, bytes]:
-    config.ensure_app_dirs()
-    storage.init_db()
-    user = storage.get_user_by_username(username)
-    if user is None:
-        raise ValueError("User not found")
-    salt = user["salt"]
-    key = _derive_user_key(master_password, salt)
-    # verify
-    try:
-        val = crypto.decrypt(user["verifier"], key)
-        if val != "verification":
-            raise ValueError("Invalid master password")
-    except Exception as ex:
-        raise ValueError("Invalid master password") from ex
-    return int(user["id"]), key
+    with VaultSession.login(username, master_password) as session:
+        return session.user_id, session.key
 
 
 def get_user_profile(user_id: int) -> Optional[Dict[str, str]]:
@@ -90,64 +67,57 @@ def get_user_profile(user_id: int) -> Optional[Dict[str, str]]:
 
 
 def add_password(user_id: int, key: bytes, site: str, username: str, password: str) -> int:
-    token = crypto.encrypt(password, key)
-    return storage.add_entry(site=site, username=username, secret=token, user_id=user_id)
+    with VaultSession(user_id, key) as session:
+        return session.add_password(site, username, password)
 
 
 def list_passwords(user_id: int, key: bytes) -> List[Dict[str, str]]:
-    items = storage.list_entries(user_id)
-    result: List[Dict[str, str]] = []
-    for it in items:
-        try:
-            pwd = crypto.decrypt(it.secret, key)
-        except Exception:
-            pwd = "<unable to decrypt>"
-        result.append({"id": it.id, "site": it.site, "username": it.username, "password": pwd})
-    return result
+    with VaultSession(user_id, key) as session:
+        return session.list_passwords()
+
+def find_by_url(user_id: int, url: str, key: Optional[bytes] = None, match_domain: bool = False) -> List[Dict[str, str]]:
+    """Entries stored for the host of `url` or one of its parent hosts, via the host index.
+
+    Passwords are decrypted only when `key` is given. `match_domain` opts in to
+    the looser registrable-domain fallback (see app.urls).
+    """
+    if key is not None:
+        with VaultSession(user_id, key) as session:
+            return session.find_by_url(url, match_domain=match_domain)
+    return [
+        {"id": it.id, "site": it.site, "username": it.username}
+        for it in storage.find_entries_by_url(user_id, url, match_domain)
+    ]
+
+def verify_vault(user_id: int, key: bytes, incremental: bool = False) -> verify.VerifyReport:
+    """Authenticate every stored token and run SQLite's integrity check; see app.verify."""
+    return verify.verify_vault(user_id, key, incremental=incremental)
 
 def delete_password(user_id: int, entry_id: int) -> bool:
     return storage.delete_entry(entry_id, user_id)
 
 
-def change_master_password(user_id: int, old_password: str, new_password: str) -> None:
+def change_master_password(
+    user_id: int,
+    old_password: str,
+    new_password: str,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> None:
     """Change master password by re-encrypting all secrets with new key and updating verifier.
 
     Steps:
-    - derive old and new keys
+    - derive the old key and verify it (VaultSession.unlock)
     - decrypt each vault item with old key and re-encrypt with new key
+    - re-encrypt attachment chunks and names
     - update user verifier
+
+    `progress(done, total)` is called after each re-encrypted entry if given.
     """
-    storage.init_db()
-    user = storage.get_user_by_id(user_id)
-    if user is None:
-        raise ValueError("No user registered")
-    salt = user["salt"]
-    old_key = _derive_user_key(old_password, salt)
-    # verify old
-    try:
-        if crypto.decrypt(user["verifier"], old_key) != "verification":
-            raise ValueError("Invalid old password")
-    except Exception as ex:
-        raise ValueError("Invalid old password") from ex
-
-    # Password policy for new master password
-    if len(new_password) < 12 or not any(c.islower() for c in new_password) or not any(c.isupper() for c in new_password) or not any(c.isdigit() for c in new_password):
-        raise ValueError("Password must be 12+ chars with upper, lower, digit")
-    new_key = _derive_user_key(new_password, salt)
-
-    # re-encrypt vault
-    items = storage.list_entries(user_id)
-    for it in items:
-        plaintext = crypto.decrypt(it.secret, old_key)
-        new_token = crypto.encrypt(plaintext, new_key)
-        storage.update_entry_secret(it.id, new_token, user_id)
-
-    # update verifier
-    new_verifier = crypto.encrypt("verification", new_key)
-    storage.update_user_verifier(user_id, new_verifier)
+    with VaultSession.unlock(user_id, old_password) as session:
+        session.set_master_password(new_password, progress)
 
 
 def update_password(user_id: int, key: bytes, entry_id: int, new_password: str) -> None:
     """Update a single vault entry's password by re-encrypting its secret."""
-    token = crypto.encrypt(new_password, key)
-    storage.update_entry_secret(entry_id, token, user_id)
+    with VaultSession(user_id, key) as session:
+        session.update_password(entry_id, new_password)
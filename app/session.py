@@ -0,0 +1,329 @@
+"""Per-user vault session owning its connection, key, cipher and caches.
+
+Contract:
+- VaultSession.login(username, master_password, db_path=None) -> VaultSession
+- VaultSession.unlock(user_id, master_password, db_path=None) -> VaultSession
+- VaultSession.register(username, full_name, email, master_password, db_path=None) -> VaultSession
+- session.add_password / list_passwords / find_by_url / update_password /
+  delete_password / get_user_profile / change_master_password / verify / close
+- session.recover_attachments(old_password) -> int  # after a sync brought a re-key
+
+Notes
+-----
+- A session keeps one SQLite connection to its own `db_path` for its lifetime
+  and passes it to `app.storage`, so several vaults can be open in one process.
+- The Fernet cipher is built once per key. Decrypted listings and the profile
+  are cached; the cache is dropped on the session's own writes and when
+  `PRAGMA data_version` shows a commit from another connection (e.g. a sync).
+- The schema is migrated once per database file and process
+  (`storage.ensure_db`), not for every session.
+- The connection may be used from a worker thread (the GUI task runner); calls
+  are serialized by a lock.
+- `close()` (or leaving the `with` block) closes the connection and drops the
+  key, cipher and caches. `close(wait=False)` marks the session closed at once
+  and, if a call is still running, lets a helper thread release the connection
+  when it returns, so a Tk handler never blocks on it. `app.services` functions
+  wrap short-lived sessions.
+"""
+from __future__ import annotations
+
+import hmac
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+from . import attachments, config, crypto, login_scheduler, storage, verify
+
+
+def check_password_policy(master_password: str) -> None:
+    # Password policy: min length 12, must include upper, lower, digit
+    if len(master_password) < 12 or not any(c.islower() for c in master_password) or not any(c.isupper() for c in master_password) or not any(c.isdigit() for c in master_password):
+        raise ValueError("Password must be 12+ chars with upper, lower, digit")
+
+
+def _resolve_db_path(db_path: Optional[Path]) -> Path:
+    if db_path is None:
+        return config.get_db_path()
+    return Path(db_path)
+
+
+def _open_user(user: Optional[Dict[str, Any]], master_password: str, missing: str, invalid: str) -> bytes:
+    if user is None:
+        raise ValueError(missing)
+    key = crypto.derive_key(master_password, user["salt"])
+    try:
+        if crypto.decrypt(user["verifier"], key) != "verification":
+            raise ValueError(invalid)
+    except Exception as ex:
+        raise ValueError(invalid) from ex
+    return key
+
+
+class VaultSession:
+    def __init__(self, user_id: int, key: bytes, db_path: Optional[Path] = None):
+        self.user_id = int(user_id)
+        self.db_path = _resolve_db_path(db_path)
+        self._lock = threading.RLock()
+        self._closed = False
+        # Migrates once per file and process; a set lookup after that
+        storage.ensure_db(self.db_path)
+        self._conn: Optional[sqlite3.Connection] = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._set_key(key)
+        self._profile: Optional[Dict[str, str]] = None
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._data_version = -1
+
+    # Construction
+
+    @classmethod
+    def login(cls, username: str, master_password: str, db_path: Optional[Path] = None) -> "VaultSession":
+        # Key derivation goes through the shared bounded pool (admission control,
+        # per-username backoff); see app.login_scheduler.
+        path = _resolve_db_path(db_path)
+        user_id, key = login_scheduler.get_scheduler().login(username, master_password, path)
+        return cls(user_id, key, path)
+
+    @classmethod
+    def unlock(cls, user_id: int, master_password: str, db_path: Optional[Path] = None) -> "VaultSession":
+        path = _resolve_db_path(db_path)
+        storage.ensure_db(path)
+        user = storage.get_user_by_id(user_id, path)
+        key = _open_user(user, master_password, "No user registered", "Invalid old password")
+        return cls(user_id, key, path)
+
+    @classmethod
+    def register(cls, username: str, full_name: str, email: str, master_password: str, db_path: Optional[Path] = None) -> "VaultSession":
+        path = _resolve_db_path(db_path)
+        storage.ensure_db(path)
+        if not username or len(username) < 3:
+            raise ValueError("Username must be at least 3 characters")
+        if storage.get_user_by_username(username, path) is not None:
+            raise ValueError("Username already exists")
+        check_password_policy(master_password)
+        salt = crypto.generate_salt(16)
+        key = crypto.derive_key(master_password, salt)
+        verifier = crypto.encrypt("verification", key)
+        user_id = storage.create_user(username=username, full_name=full_name, email=email, salt=salt, verifier=verifier, db_path=path)
+        return cls(user_id, key, path)
+
+    # Lifecycle
+
+    def __enter__(self) -> "VaultSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self, wait: bool = True) -> None:
+        # Calls made from here on fail, even if a running one still holds the lock
+        self._closed = True
+        if not self._lock.acquire(blocking=wait):
+            threading.Thread(target=self.close, name="vault-session-close", daemon=True).start()
+            return
+        try:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.key = b""
+            self._cipher = None
+            self._profile = None
+            self._entries = None
+        finally:
+            self._lock.release()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._closed or self._conn is None:
+            raise ValueError("Session is closed")
+        return self._conn
+
+    def _set_key(self, key: bytes) -> None:
+        self.key = key
+        self._cipher = crypto.cipher(key)
+
+    def _invalidate(self) -> None:
+        self._entries = None
+
+    def _cache_valid(self) -> bool:
+        version = self._db().execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._entries = None
+            self._profile = None
+        return self._entries is not None
+
+    def _decrypt_or_marker(self, token: str) -> str:
+        try:
+            return crypto.decrypt(token, self._cipher)
+        except Exception:
+            return "<unable to decrypt>"
+
+    # Vault operations
+
+    def get_user_profile(self) -> Optional[Dict[str, str]]:
+        with self._lock:
+            self._cache_valid()
+            if self._profile is None:
+                user = storage.get_user_by_id(self.user_id, self._db())
+                if user is None:
+                    return None
+                self._profile = {"username": user.get("username") or "", "full_name": user.get("full_name") or "", "email": user.get("email") or ""}
+            return dict(self._profile)
+
+    def add_password(self, site: str, username: str, password: str) -> int:
+        with self._lock:
+            token = crypto.encrypt(password, self._cipher)
+            entry_id = storage.add_entry(site=site, username=username, secret=token, user_id=self.user_id, db_path=self._db())
+            self._invalidate()
+            return entry_id
+
+    def list_passwords(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            if not self._cache_valid():
+                self._entries = [
+                    {"id": it.id, "site": it.site, "username": it.username, "password": self._decrypt_or_marker(it.secret)}
+                    for it in storage.list_entries(self.user_id, self._db())
+                ]
+            return [dict(e) for e in self._entries]
+
+    def find_by_url(self, url: str, decrypt: bool = True, match_domain: bool = False) -> List[Dict[str, Any]]:
+        """Entries stored for the host of `url` or a parent host; see storage.find_entries_by_url."""
+        with self._lock:
+            result = []
+            for it in storage.find_entries_by_url(self.user_id, url, match_domain, self._db()):
+                entry = {"id": it.id, "site": it.site, "username": it.username}
+                if decrypt:
+                    entry["password"] = self._decrypt_or_marker(it.secret)
+                result.append(entry)
+            return result
+
+    def update_password(self, entry_id: int, new_password: str) -> None:
+        with self._lock:
+            token = crypto.encrypt(new_password, self._cipher)
+            storage.update_entry_secret(entry_id, token, self.user_id, self._db())
+            self._invalidate()
+
+    def delete_password(self, entry_id: int) -> bool:
+        with self._lock:
+            ok = storage.delete_entry(entry_id, self.user_id, self._db())
+            self._invalidate()
+            return ok
+
+    def change_master_password(self, old_password: str, new_password: str, progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Verify the old password against this session's key, then re-key the vault."""
+        with self._lock:
+            user = storage.get_user_by_id(self.user_id, self._db())
+            if user is None:
+                raise ValueError("No user registered")
+            old_key = crypto.derive_key(old_password, user["salt"])
+            if not hmac.compare_digest(old_key, self.key):
+                raise ValueError("Invalid old password")
+            self.set_master_password(new_password, progress)
+
+    def set_master_password(self, new_password: str, progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Re-encrypt all secrets and attachments under a key derived from `new_password`.
+
+        Everything is decrypted with the current key first, so an undecryptable
+        entry or attachment aborts before any write. Entries, attachments and the
+        verifier are then rewritten in one transaction on the session connection
+        and rolled back on any failure. `progress(done, total)` is called after
+        each re-encrypted entry if given.
+        """
+        with self._lock:
+            check_password_policy(new_password)
+            conn = self._db()
+            user = storage.get_user_by_id(self.user_id, conn)
+            if user is None:
+                raise ValueError("No user registered")
+            if attachments.previous_verifier(self.user_id, conn) is not None:
+                raise ValueError(
+                    "Attachments still use the master password from before the last sync;"
+                    " run recover_attachments(old_password) first"
+                )
+
+            new_key = crypto.derive_key(new_password, user["salt"])
+            new_cipher = crypto.cipher(new_key)
+
+            # The write lock is taken before reading, so no entry or attachment
+            # can be added by another connection between the check and the rewrite.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                items = conn.execute("SELECT id, secret FROM vault WHERE user_id = ? ORDER BY id", (self.user_id,)).fetchall()
+                plaintexts = []
+                for entry_id, token in items:
+                    try:
+                        plaintexts.append(crypto.decrypt(token, self._cipher))
+                    except Exception as ex:
+                        raise ValueError(f"Entry {entry_id} cannot be decrypted; master password not changed") from ex
+                bad = attachments.check_attachments(self.user_id, self.key, db_path=conn)
+                if bad:
+                    raise ValueError(f"Attachment {bad[0][0]} cannot be decrypted; master password not changed")
+
+                for done, ((entry_id, _), plaintext) in enumerate(zip(items, plaintexts), start=1):
+                    storage.set_entry_secret(conn, entry_id, crypto.encrypt(plaintext, new_cipher), self.user_id)
+                    if progress is not None:
+                        progress(done, len(items))
+                attachments.reencrypt_attachments(self.user_id, self.key, new_key, conn)
+                storage.set_user_verifier(conn, self.user_id, crypto.encrypt("verification", new_cipher))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            self._set_key(new_key)
+            self._invalidate()
+
+    def recover_attachments(self, old_password: str) -> int:
+        """Move attachments left under a previous key (see app.sync) to the current key.
+
+        `old_password` is the master password this replica used before the sync.
+        Returns the number of attachments re-encrypted.
+        """
+        with self._lock:
+            conn = self._db()
+            old_verifier = attachments.previous_verifier(self.user_id, conn)
+            if old_verifier is None:
+                return 0
+            user = storage.get_user_by_id(self.user_id, conn)
+            old_key = _open_user(
+                dict(user, verifier=old_verifier) if user else None, old_password, "No user registered", "Invalid old password"
+            )
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Attachments the current key already opens (e.g. re-keyed here too) are left as they are
+                stale = [a for a, _ in attachments.check_attachments(self.user_id, self.key, db_path=conn)]
+                bad = attachments.check_attachments(self.user_id, old_key, stale, db_path=conn) if stale else []
+                if bad:
+                    raise ValueError(f"Attachment {bad[0][0]} cannot be decrypted with the old password")
+                count = attachments.reencrypt_attachments(self.user_id, old_key, self.key, conn, stale)
+                attachments.clear_rekeyed(conn, self.user_id)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return count
+
+    def verify(self, incremental: bool = False) -> verify.VerifyReport:
+        with self._lock:
+            self._db()  # workers open the file themselves, but only for an open session
+            return verify.verify_vault(self.user_id, self.key, incremental=incremental, db_path=self.db_path)
+
+    # Attachments
+
+    def add_attachment(self, name: str, stream: BinaryIO, entry_id: Optional[int] = None) -> int:
+        with self._lock:
+            return attachments.add_attachment(self.user_id, self.key, name, stream, entry_id=entry_id, db_path=self._db())
+
+    def open_attachment(self, attachment_id: int) -> attachments.AttachmentReader:
+        with self._lock:
+            self._db()
+            # The reader outlives this call and is read from any thread, so it gets
+            # its own connection rather than sharing the session's transactions
+            return attachments.open_attachment(self.user_id, self.key, attachment_id, self.db_path)
+
+    def list_attachments(self, entry_id: Optional[int] = None) -> List[Dict[str, object]]:
+        with self._lock:
+            return attachments.list_attachments(self.user_id, self.key, entry_id=entry_id, db_path=self._db())
@@ -0,0 +1,57 @@
+"""Startup profiling for `main.py --profile-startup`.
+
+Contract:
+- profile_startup() -> list[tuple[str, float]]  # (phase, seconds), in order
+- format_report(timings) -> str
+
+Notes
+-----
+- Measures the phases up to the first drawn login window: importing the GUI,
+  building the Tk root and login frame, and the first `update()`.
+- Also reports whether heavy modules (the `cryptography` stack, storage) were
+  loaded before the window appeared; they should only load lazily.
+- Needs a display; Tk raises TclError otherwise.
+"""
+from __future__ import annotations
+
+import sys
+import time
+from typing import List, Tuple
+
+HEAVY_MODULES = ("cryptography", "app.crypto", "app.services", "app.storage", "sqlite3")
+
+
+def profile_startup() -> List[Tuple[str, float]]:
+    timings: List[Tuple[str, float]] = []
+    start = last = time.perf_counter()
+
+    def mark(phase: str) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        timings.append((phase, now - last))
+        last = now
+
+    from .gui import App
+
+    mark("import app.gui")
+    app = App(warm_up=False)
+    mark("App() + login frame")
+    app.update()
+    mark("first window drawn")
+    app.destroy()
+    timings.append(("time to first window", last - start))
+    return timings
+
+
+def loaded_heavy_modules() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def format_report(timings: List[Tuple[str, float]]) -> str:
+    lines = ["Startup profile:"]
+    for phase, seconds in timings:
+        lines.append(f"  {phase:<24} {seconds * 1000:8.1f} ms")
+    heavy = loaded_heavy_modules()
+    lines.append(f"  heavy modules loaded before first window: {', '.join(heavy) or 'none'}")
+    lines.append(f"  modules loaded: {len(sys.modules)}")
+    return "\n".join(lines)
@@ -6,26 +6,54 @@ Tables:
          full_name TEXT,
          email TEXT,
          salt BLOB NOT NULL,
-         verifier TEXT NOT NULL
+         verifier TEXT NOT NULL,
+         updated_at INTEGER, origin TEXT, seq INTEGER
 - vault: id INTEGER PRIMARY KEY AUTOINCREMENT,
          user_id INTEGER NOT NULL,
          site TEXT NOT NULL,
          username TEXT NOT NULL,
-         secret TEXT NOT NULL
+         secret TEXT NOT NULL,
+         uid TEXT, updated_at INTEGER, origin TEXT, seq INTEGER,
+         site_host TEXT, site_domain TEXT  (derived from site, see app.urls)
+- tombstones: uid TEXT PRIMARY KEY, user_id, updated_at, origin, seq
+- attachments: id INTEGER PRIMARY KEY AUTOINCREMENT, user_id, entry_id (nullable),
+               name TEXT (Fernet token), size, chunk_size, chunk_count, created_at
+- attachment_chunks: attachment_id, idx, data BLOB  (see app.attachments)
+- meta: key TEXT PRIMARY KEY, value TEXT  (replica_id, seq counter)
+- sync_peers: replica_id TEXT PRIMARY KEY, last_seq INTEGER
 
 Notes
 -----
 - Multi-user model; each user has their own salt. Vault rows scoped by user_id.
 - `verifier` is an encrypted token used to validate the master password.
+- Every write stamps the row with a local change sequence (`seq`), a wall-clock
+  version (`updated_at`, ms) and the replica that authored it (`origin`). Deletes
+  leave a tombstone. `app.sync` uses these to exchange only changed rows.
+- `site_host`/`site_domain` are computed from `site` on every write and indexed
+  with `user_id`, so URL lookups (`find_entries_by_url`) do not scan the vault.
+- `init_db` creates and migrates the schema. Long-lived callers (sessions, sync,
+  the login scheduler) use `ensure_db`, which runs it once per database file
+  per process. One-off backfills are recorded in `meta` and never rescanned.
 """
 from __future__ import annotations
 
+import hashlib
+import os
 import sqlite3
+import threading
+import time
+import uuid
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple, Dict, Any
+from typing import Iterable, List, Optional, Tuple, Dict, Any, Union
 
 from .config import get_db_path
+from .urls import candidate_hosts, site_keys
+
+
+# Functions take a database path or an already open connection (as held by
+# `app.session.VaultSession`), which is reused instead of opening a new one.
+Database = Union[Path, sqlite3.Connection]
 
 
 @dataclass
@@ -36,12 +64,14 @@ class VaultItem:
     secret: str  # Fernet token
 
 
-def _connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+def _connect(db_path: Optional[Database] = None) -> sqlite3.Connection:
+    if isinstance(db_path, sqlite3.Connection):
+        return db_path
     path = db_path or get_db_path()
     return sqlite3.connect(path)
 
 
-def init_db(db_path: Optional[Path] = None) -> None:
+def init_db(db_path: Optional[Database] = None) -> None:
     """Create tables if not exist."""
     with _connect(db_path) as conn:
         conn.execute(
@@ -52,7 +82,10 @@ def init_db(db_path: Optional[Path] = None) -> None:
                 full_name TEXT,
                 email TEXT,
                 salt BLOB NOT NULL,
-                verifier TEXT NOT NULL
+                verifier TEXT NOT NULL,
+                updated_at INTEGER,
+                origin TEXT,
+                seq INTEGER
             )
             """
         )
@@ -63,10 +96,56 @@ def init_db(db_path: Optional[Path] = None) -> None:
                 user_id INTEGER NOT NULL,
                 site TEXT NOT NULL,
                 username TEXT NOT NULL,
-                secret TEXT NOT NULL
+                secret TEXT NOT NULL,
+                uid TEXT,
+                updated_at INTEGER,
+                origin TEXT,
+                seq INTEGER,
+                site_host TEXT,
+                site_domain TEXT
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tombstones (
+                uid TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                origin TEXT NOT NULL,
+                seq INTEGER NOT NULL
             )
             """
         )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS attachments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                entry_id INTEGER,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                created_at INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS attachment_chunks (
+                attachment_id INTEGER NOT NULL,
+                idx INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (attachment_id, idx)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_attachments_user_entry ON attachments(user_id, entry_id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_peers (replica_id TEXT PRIMARY KEY, last_seq INTEGER NOT NULL)"
+        )
         # Best-effort migration: ensure vault has user_id column
         try:
             cur = conn.execute("PRAGMA table_info(vault)")
@@ -76,23 +155,126 @@ def init_db(db_path: Optional[Path] = None) -> None:
                 conn.execute("UPDATE vault SET user_id = 1 WHERE user_id IS NULL")
         except Exception:
             pass
+        _migrate_change_tracking(conn)
+        _migrate_site_index(conn)
         conn.commit()
 
 
-def add_entry(site: str, username: str, secret: str, user_id: int, db_path: Optional[Path] = None) -> int:
+_initialized: set = set()
+_init_lock = threading.Lock()
+
+
+def ensure_db(db_path: Optional[Path] = None) -> None:
+    """Run init_db for `db_path` unless this process already did for that file."""
+    path = os.path.realpath(db_path or get_db_path())
+    with _init_lock:
+        try:
+            st = os.stat(path)
+            ident = (path, st.st_dev, st.st_ino)  # a file replaced on disk is migrated again
+        except OSError:
+            ident = None
+        if ident is not None and ident in _initialized:
+            return
+        init_db(Path(path))
+        st = os.stat(path)
+        _initialized.add((path, st.st_dev, st.st_ino))
+
+
+def _migrate_change_tracking(conn: sqlite3.Connection) -> None:
+    """Add sync columns to older databases and stamp rows that lack them."""
+    for table, extra in (("users", ("updated_at", "origin", "seq")), ("vault", ("uid", "updated_at", "origin", "seq"))):
+        cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        for col in extra:
+            if col not in cols:
+                kind = "TEXT" if col in ("uid", "origin") else "INTEGER"
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {kind}")
+    replica_id(conn)
+    # Legacy rows get a uid derived from their content and a neutral version
+    # (updated_at 0, empty origin), so two upgraded copies of the same old vault
+    # hold identical rows and their first sync exchanges nothing.
+    rows = conn.execute(
+        "SELECT v.id, v.site, v.username, v.secret, u.username FROM vault v"
+        " LEFT JOIN users u ON u.id = v.user_id WHERE v.uid IS NULL"
+    ).fetchall()
+    for row_id, site, username, secret, owner in rows:
+        conn.execute("UPDATE vault SET uid = ? WHERE id = ?", (_legacy_uid(owner, row_id, site, username, secret), row_id))
+    for table in ("users", "vault"):
+        if conn.execute(f"SELECT 1 FROM {table} WHERE seq IS NULL LIMIT 1").fetchone():
+            conn.execute(
+                f"UPDATE {table} SET updated_at = 0, origin = '', seq = ? WHERE seq IS NULL",
+                (next_seq(conn),),
+            )
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_vault_uid ON vault(uid)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vault_seq ON vault(seq)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_seq ON users(seq)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_seq ON tombstones(seq)")
+
+
+def _legacy_uid(owner: Optional[str], row_id: int, site: str, username: str, secret: str) -> str:
+    data = "\x1f".join([owner or "", str(row_id), site, username, secret])
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+
+
+def _migrate_site_index(conn: sqlite3.Connection) -> None:
+    """Add and backfill the normalized site columns and their index."""
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(vault)").fetchall()]
+    for col in ("site_host", "site_domain"):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE vault ADD COLUMN {col} TEXT")
+    # Every write since this migration stamps the columns, so the (full scan)
+    # backfill only has to run once per database
+    if not conn.execute("SELECT 1 FROM meta WHERE key = 'site_index'").fetchone():
+        rows = conn.execute("SELECT id, site FROM vault WHERE site_domain IS NULL").fetchall()
+        conn.executemany(
+            "UPDATE vault SET site_host = ?, site_domain = ? WHERE id = ?",
+            [(*site_keys(site), row_id) for row_id, site in rows],
+        )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('site_index', '1')")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vault_user_domain ON vault(user_id, site_domain)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vault_user_host ON vault(user_id, site_host)")
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def replica_id(conn: sqlite3.Connection) -> str:
+    """Return this database's stable replica id, creating it on first use."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'replica_id'").fetchone()
+    if row:
+        return row[0]
+    rid = uuid.uuid4().hex
+    conn.execute("INSERT INTO meta (key, value) VALUES ('replica_id', ?)", (rid,))
+    return rid
+
+
+def next_seq(conn: sqlite3.Connection) -> int:
+    """Allocate the next local change sequence number (within the caller's transaction)."""
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('seq', '0')")
+    conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'seq'")
+    return int(conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()[0])
+
+
+def _stamp(conn: sqlite3.Connection) -> Tuple[int, str, int]:
+    return now_ms(), replica_id(conn), next_seq(conn)
+
+
+def add_entry(site: str, username: str, secret: str, user_id: int, db_path: Optional[Database] = None) -> int:
     """Insert a new entry and return new row id."""
     if not site or not username or not secret:
         raise ValueError("site, username and secret are required")
     with _connect(db_path) as conn:
+        updated_at, origin, seq = _stamp(conn)
         cur = conn.execute(
-            "INSERT INTO vault (user_id, site, username, secret) VALUES (?, ?, ?, ?)",
-            (user_id, site, username, secret),
+            "INSERT INTO vault (user_id, site, username, secret, uid, updated_at, origin, seq, site_host, site_domain)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, site, username, secret, uuid.uuid4().hex, updated_at, origin, seq, *site_keys(site)),
         )
         conn.commit()
         return int(cur.lastrowid)
 
 
-def list_entries(user_id: int, db_path: Optional[Path] = None) -> List[VaultItem]:
+def list_entries(user_id: int, db_path: Optional[Database] = None) -> List[VaultItem]:
     with _connect(db_path) as conn:
         cur = conn.execute(
             "SELECT id, site, username, secret FROM vault WHERE user_id = ? ORDER BY id DESC",
@@ -102,16 +284,68 @@ def list_entries(user_id: int, db_path: Optional[Path] = None) -> List[VaultItem
         return [VaultItem(id=row[0], site=row[1], username=row[2], secret=row[3]) for row in rows]
 
 
-def delete_entry(entry_id: int, user_id: int, db_path: Optional[Path] = None) -> bool:
+def find_entries_by_url(user_id: int, url: str, match_domain: bool = False, db_path: Optional[Database] = None) -> List[VaultItem]:
+    """Entries whose stored host is the URL's host or one of its parents.
+
+    Most specific host first. With `match_domain`, fall back to the heuristic
+    registrable domain (see app.urls) when nothing matches by host.
+    """
+    host, domain = site_keys(url)
+    hosts = candidate_hosts(host)
+    if not hosts:
+        return []
+    placeholders = ",".join("?" * len(hosts))
+    with _connect(db_path) as conn:
+        cur = conn.execute(
+            f"SELECT id, site, username, secret FROM vault WHERE user_id = ? AND site_host IN ({placeholders})"
+            " ORDER BY length(site_host) DESC, id DESC",
+            (user_id, *hosts),
+        )
+        items = [VaultItem(id=row[0], site=row[1], username=row[2], secret=row[3]) for row in cur.fetchall()]
+    if not items and match_domain:
+        items = find_entries_by_domain(user_id, domain, host, db_path)
+    return items
+
+
+def find_entries_by_domain(user_id: int, domain: str, host: str = "", db_path: Optional[Database] = None) -> List[VaultItem]:
+    """Entries whose registrable domain matches; exact host matches come first."""
+    with _connect(db_path) as conn:
+        cur = conn.execute(
+            "SELECT id, site, username, secret FROM vault WHERE user_id = ? AND site_domain = ?"
+            " ORDER BY site_host = ? DESC, id DESC",
+            (user_id, domain, host),
+        )
+        return [VaultItem(id=row[0], site=row[1], username=row[2], secret=row[3]) for row in cur.fetchall()]
+
+
+def delete_entry(entry_id: int, user_id: int, db_path: Optional[Database] = None) -> bool:
     with _connect(db_path) as conn:
+        row = conn.execute("SELECT uid FROM vault WHERE id = ? AND user_id = ?", (entry_id, user_id)).fetchone()
         cur = conn.execute("DELETE FROM vault WHERE id = ? AND user_id = ?", (entry_id, user_id))
+        if cur.rowcount:
+            delete_entry_attachments(conn, entry_id)
+        if row and row[0]:
+            updated_at, origin, seq = _stamp(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO tombstones (uid, user_id, updated_at, origin, seq) VALUES (?, ?, ?, ?, ?)",
+                (row[0], user_id, updated_at, origin, seq),
+            )
         conn.commit()
         return cur.rowcount > 0
 
 
+def delete_entry_attachments(conn: sqlite3.Connection, entry_id: int) -> None:
+    """Delete the attachments of a vault row, within the caller's transaction (no commit)."""
+    conn.execute(
+        "DELETE FROM attachment_chunks WHERE attachment_id IN (SELECT id FROM attachments WHERE entry_id = ?)",
+        (entry_id,),
+    )
+    conn.execute("DELETE FROM attachments WHERE entry_id = ?", (entry_id,))
+
+
 # User management (single-user)
 
-def get_user_by_username(username: str, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+def get_user_by_username(username: str, db_path: Optional[Database] = None) -> Optional[Dict[str, Any]]:
     with _connect(db_path) as conn:
         cur = conn.execute(
             "SELECT id, username, full_name, email, salt, verifier FROM users WHERE username = ?",
@@ -130,7 +364,7 @@ def get_user_by_username(username: str, db_path: Optional[Path] = None) -> Optio
         }
 
 
-def get_user_by_id(user_id: int, db_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+def get_user_by_id(user_id: int, db_path: Optional[Database] = None) -> Optional[Dict[str, Any]]:
     with _connect(db_path) as conn:
         cur = conn.execute(
             "SELECT id, username, full_name, email, salt, verifier FROM users WHERE id = ?",
@@ -149,23 +383,43 @@ def get_user_by_id(user_id: int, db_path: Optional[Path] = None) -> Optional[Dic
         }
 
 
-def create_user(username: str, full_name: str, email: str, salt: bytes, verifier: str, db_path: Optional[Path] = None) -> int:
+def create_user(username: str, full_name: str, email: str, salt: bytes, verifier: str, db_path: Optional[Database] = None) -> int:
     with _connect(db_path) as conn:
+        updated_at, origin, seq = _stamp(conn)
         cur = conn.execute(
-            "INSERT INTO users (username, full_name, email, salt, verifier) VALUES (?, ?, ?, ?, ?)",
-            (username, full_name, email, salt, verifier),
+            "INSERT INTO users (username, full_name, email, salt, verifier, updated_at, origin, seq)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (username, full_name, email, salt, verifier, updated_at, origin, seq),
         )
         conn.commit()
         return int(cur.lastrowid)
 
 
-def update_user_verifier(user_id: int, verifier: str, db_path: Optional[Path] = None) -> None:
+def update_user_verifier(user_id: int, verifier: str, db_path: Optional[Database] = None) -> None:
     with _connect(db_path) as conn:
-        conn.execute("UPDATE users SET verifier = ? WHERE id = ?", (verifier, user_id))
+        set_user_verifier(conn, user_id, verifier)
         conn.commit()
 
 
-def update_entry_secret(entry_id: int, secret: str, user_id: int, db_path: Optional[Path] = None) -> None:
+def update_entry_secret(entry_id: int, secret: str, user_id: int, db_path: Optional[Database] = None) -> None:
     with _connect(db_path) as conn:
-        conn.execute("UPDATE vault SET secret = ? WHERE id = ? AND user_id = ?", (secret, entry_id, user_id))
+        set_entry_secret(conn, entry_id, secret, user_id)
         conn.commit()
+
+
+def set_user_verifier(conn: sqlite3.Connection, user_id: int, verifier: str) -> None:
+    """Like update_user_verifier, within the caller's transaction (no commit)."""
+    updated_at, origin, seq = _stamp(conn)
+    conn.execute(
+        "UPDATE users SET verifier = ?, updated_at = ?, origin = ?, seq = ? WHERE id = ?",
+        (verifier, updated_at, origin, seq, user_id),
+    )
+
+
+def set_entry_secret(conn: sqlite3.Connection, entry_id: int, secret: str, user_id: int) -> None:
+    """Like update_entry_secret, within the caller's transaction (no commit)."""
+    updated_at, origin, seq = _stamp(conn)
+    conn.execute(
+        "UPDATE vault SET secret = ?, updated_at = ?, origin = ?, seq = ? WHERE id = ? AND user_id = ?",
+        (secret, updated_at, origin, seq, entry_id, user_id),
+    )
@@ -0,0 +1,234 @@
+"""Incremental two-way sync between vault database files.
+
+Contract:
+- collect_changes(db_path, peer_id, since) -> Changeset
+- apply_changes(db_path, changeset) -> int  # number of rows changed locally
+- sync_databases(a, b) -> tuple[int, int]
+- reset_replica_id(db_path) -> str  # after copying a vault file by hand
+- changeset_to_json(cs) -> str / changeset_from_json(s) -> Changeset
+
+Notes
+-----
+- Each database has a `replica_id` and a local change counter (`seq`) kept by
+  `app.storage`. A sync point is the highest peer `seq` already applied, stored in
+  `sync_peers`, so a sync only reads rows with `seq > since` (indexed): cost is
+  proportional to the number of changes, not to the vault size.
+- Conflicts are last-writer-wins on `(updated_at, origin)`; the origin replica id
+  breaks ties, so both sides pick the same winner.
+- Secrets travel as Fernet tokens and are never decrypted. Users are matched by
+  username; a user whose salt differs between replicas cannot be merged.
+- Changesets are plain JSON so they can be sent over a pipe or local socket:
+  the receiver replies with its sync point for the sender (`get_sync_point`).
+- Attachments stay local to each replica (their associated data binds local
+  ids). Deleting an entry through sync deletes its local attachments too.
+- A peer's master password change arrives as a new verifier, but local
+  attachments remain under the old key. The replaced verifier is recorded
+  (`attachments.mark_rekeyed`); until `VaultSession.recover_attachments(old)`
+  moves them to the current key, the session refuses another re-key.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from base64 import b64decode, b64encode
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import attachments, storage
+from .urls import site_keys
+
+
+@dataclass
+class Changeset:
+    replica_id: str
+    seq: int  # highest local seq covered by this changeset
+    users: List[Dict[str, Any]] = field(default_factory=list)
+    entries: List[Dict[str, Any]] = field(default_factory=list)
+    tombstones: List[Dict[str, Any]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.users) + len(self.entries) + len(self.tombstones)
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    storage.ensure_db(db_path)
+    return sqlite3.connect(db_path)
+
+
+def get_replica_id(db_path: Path) -> str:
+    with _connect(db_path) as conn:
+        rid = storage.replica_id(conn)
+        conn.commit()
+        return rid
+
+
+def reset_replica_id(db_path: Path) -> str:
+    """Give a copied vault file its own identity so it can sync with the original."""
+    with _connect(db_path) as conn:
+        conn.execute("DELETE FROM meta WHERE key = 'replica_id'")
+        conn.execute("DELETE FROM sync_peers")
+        rid = storage.replica_id(conn)
+        conn.commit()
+        return rid
+
+
+def get_sync_point(db_path: Path, peer_id: str) -> int:
+    """Return the highest seq of `peer_id` already applied to this database."""
+    with _connect(db_path) as conn:
+        row = conn.execute("SELECT last_seq FROM sync_peers WHERE replica_id = ?", (peer_id,)).fetchone()
+        return int(row[0]) if row else 0
+
+
+def collect_changes(db_path: Path, peer_id: Optional[str] = None, since: int = 0) -> Changeset:
+    """Collect rows changed after `since`, skipping rows last authored by `peer_id`."""
+    with _connect(db_path) as conn:
+        rid = storage.replica_id(conn)
+        conn.commit()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()
+        top = int(row[0]) if row else 0
+        cs = Changeset(replica_id=rid, seq=top)
+        peer = peer_id or ""
+        for row in conn.execute(
+            "SELECT username, full_name, email, salt, verifier, updated_at, origin FROM users"
+            " WHERE seq > ? AND origin != ?",
+            (since, peer),
+        ):
+            cs.users.append({
+                "username": row[0], "full_name": row[1], "email": row[2],
+                "salt": b64encode(row[3]).decode("ascii"), "verifier": row[4],
+                "updated_at": row[5], "origin": row[6],
+            })
+        for row in conn.execute(
+            "SELECT v.uid, u.username, v.site, v.username, v.secret, v.updated_at, v.origin"
+            " FROM vault v JOIN users u ON u.id = v.user_id WHERE v.seq > ? AND v.origin != ?",
+            (since, peer),
+        ):
+            cs.entries.append({
+                "uid": row[0], "owner": row[1], "site": row[2], "username": row[3],
+                "secret": row[4], "updated_at": row[5], "origin": row[6],
+            })
+        for row in conn.execute(
+            "SELECT t.uid, u.username, t.updated_at, t.origin FROM tombstones t"
+            " JOIN users u ON u.id = t.user_id WHERE t.seq > ? AND t.origin != ?",
+            (since, peer),
+        ):
+            cs.tombstones.append({"uid": row[0], "owner": row[1], "updated_at": row[2], "origin": row[3]})
+        return cs
+
+
+def _newer(remote: Dict[str, Any], local: Optional[Tuple[int, str]]) -> bool:
+    if local is None:
+        return True
+    return (remote["updated_at"], remote["origin"]) > (local[0] or 0, local[1] or "")
+
+
+def _local_version(conn: sqlite3.Connection, uid: str) -> Optional[Tuple[int, str]]:
+    row = conn.execute("SELECT updated_at, origin FROM vault WHERE uid = ?", (uid,)).fetchone()
+    tomb = conn.execute("SELECT updated_at, origin FROM tombstones WHERE uid = ?", (uid,)).fetchone()
+    versions = [tuple(v) for v in (row, tomb) if v]
+    return max(versions) if versions else None
+
+
+def apply_changes(db_path: Path, changeset: Changeset) -> int:
+    """Apply a peer changeset in one transaction and record the new sync point.
+
+    Raises ValueError if a user exists on both sides with a different salt.
+    """
+    applied = 0
+    with _connect(db_path) as conn:
+        user_ids: Dict[str, int] = {}
+
+        def local_user(name: str) -> int:
+            if name not in user_ids:
+                row = conn.execute("SELECT id FROM users WHERE username = ?", (name,)).fetchone()
+                if not row:
+                    raise ValueError(f"Unknown user in changeset: {name}")
+                user_ids[name] = int(row[0])
+            return user_ids[name]
+
+        for u in changeset.users:
+            salt = b64decode(u["salt"])
+            row = conn.execute(
+                "SELECT id, salt, updated_at, origin, verifier FROM users WHERE username = ?", (u["username"],)
+            ).fetchone()
+            if row and bytes(row[1]) != salt:
+                raise ValueError(f"User {u['username']!r} has a different salt on each replica")
+            if row and not _newer(u, (row[2], row[3])):
+                continue
+            seq = storage.next_seq(conn)
+            if row and row[4] != u["verifier"]:
+                attachments.mark_rekeyed(conn, row[0], row[4])
+            if row:
+                conn.execute(
+                    "UPDATE users SET full_name = ?, email = ?, verifier = ?, updated_at = ?, origin = ?, seq = ?"
+                    " WHERE id = ?",
+                    (u["full_name"], u["email"], u["verifier"], u["updated_at"], u["origin"], seq, row[0]),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO users (username, full_name, email, salt, verifier, updated_at, origin, seq)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (u["username"], u["full_name"], u["email"], salt, u["verifier"], u["updated_at"], u["origin"], seq),
+                )
+            applied += 1
+
+        for e in changeset.entries:
+            if not _newer(e, _local_version(conn, e["uid"])):
+                continue
+            seq = storage.next_seq(conn)
+            conn.execute("DELETE FROM tombstones WHERE uid = ?", (e["uid"],))
+            cur = conn.execute(
+                "UPDATE vault SET site = ?, username = ?, secret = ?, updated_at = ?, origin = ?, seq = ?,"
+                " site_host = ?, site_domain = ? WHERE uid = ?",
+                (e["site"], e["username"], e["secret"], e["updated_at"], e["origin"], seq,
+                 *site_keys(e["site"]), e["uid"]),
+            )
+            if cur.rowcount == 0:
+                conn.execute(
+                    "INSERT INTO vault (user_id, site, username, secret, uid, updated_at, origin, seq,"
+                    " site_host, site_domain) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (local_user(e["owner"]), e["site"], e["username"], e["secret"], e["uid"],
+                     e["updated_at"], e["origin"], seq, *site_keys(e["site"])),
+                )
+            applied += 1
+
+        for t in changeset.tombstones:
+            if not _newer(t, _local_version(conn, t["uid"])):
+                continue
+            seq = storage.next_seq(conn)
+            local = conn.execute("SELECT id FROM vault WHERE uid = ?", (t["uid"],)).fetchone()
+            if local:
+                storage.delete_entry_attachments(conn, local[0])
+            conn.execute("DELETE FROM vault WHERE uid = ?", (t["uid"],))
+            conn.execute(
+                "INSERT OR REPLACE INTO tombstones (uid, user_id, updated_at, origin, seq) VALUES (?, ?, ?, ?, ?)",
+                (t["uid"], local_user(t["owner"]), t["updated_at"], t["origin"], seq),
+            )
+            applied += 1
+
+        conn.execute(
+            "INSERT INTO sync_peers (replica_id, last_seq) VALUES (?, ?)"
+            " ON CONFLICT(replica_id) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq)",
+            (changeset.replica_id, changeset.seq),
+        )
+        conn.commit()
+    return applied
+
+
+def sync_databases(a: Path, b: Path) -> Tuple[int, int]:
+    """Two-way sync between two vault files. Returns rows applied to (a, b)."""
+    a_id, b_id = get_replica_id(a), get_replica_id(b)
+    if a_id == b_id:
+        raise ValueError("Both databases share the same replica id; call reset_replica_id() on the copy")
+    to_b = apply_changes(b, collect_changes(a, b_id, get_sync_point(b, a_id)))
+    to_a = apply_changes(a, collect_changes(b, a_id, get_sync_point(a, b_id)))
+    return to_a, to_b
+
+
+def changeset_to_json(changeset: Changeset) -> str:
+    return json.dumps(asdict(changeset), separators=(",", ":"))
+
+
+def changeset_from_json(data: str) -> Changeset:
+    return Changeset(**json.loads(data))
@@ -0,0 +1,89 @@
+"""Site/URL normalization used to index vault entries by domain.
+
+Contract:
+- normalize_host(site: str) -> str       # "https://www.Example.com/login" -> "example.com"
+- registrable_domain(host: str) -> str   # "login.example.co.uk" -> "example.co.uk"
+- site_keys(site: str) -> tuple[str, str]  # (host, registrable domain)
+- candidate_hosts(host: str) -> list[str]  # host and its parent hosts, for lookups
+
+Notes
+-----
+- Sites are free text, so anything that does not parse as a URL is reduced to a
+  lowercase, trimmed string and still matches itself.
+- URL lookups match a stored host only if it equals the URL's host or is one of
+  its parents (`candidate_hosts`): an entry for "example.com" serves
+  "login.example.com", but "victim.github.io" never serves "evil.github.io".
+- There is no Public Suffix List dependency, so `registrable_domain` is only a
+  heuristic (last two labels, or three for the suffixes in MULTI_LABEL_SUFFIXES).
+  It groups unrelated sites under private or unlisted suffixes (github.io,
+  herokuapp.com, com.pl...) and is therefore only used for explicit, opt-in
+  "same domain" lookups, never for autofill matching by default.
+"""
+from __future__ import annotations
+
+import ipaddress
+from typing import List, Tuple
+from urllib.parse import urlsplit
+
+MULTI_LABEL_SUFFIXES = frozenset({
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "me.uk",
+    "com.au", "net.au", "org.au", "edu.au",
+    "co.nz", "co.jp", "ne.jp", "or.jp", "co.kr", "co.in", "co.za",
+    "com.ar", "com.br", "com.co", "com.mx", "com.pe", "com.uy", "com.ve", "com.es",
+    "com.cn", "com.hk", "com.sg", "com.tr", "com.tw",
+    "gob.mx", "gob.es", "gov.br", "gov.co",
+})
+
+
+def normalize_host(site: str) -> str:
+    text = (site or "").strip().lower()
+    if not text:
+        return ""
+    try:
+        host = urlsplit(text if "://" in text else f"//{text}").hostname or text
+    except ValueError:
+        host = text
+    host = host.rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    return host
+
+
+def registrable_domain(host: str) -> str:
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split(".")
+    if len(labels) <= 2:
+        return host
+    if ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def site_keys(site: str) -> Tuple[str, str]:
+    host = normalize_host(site)
+    return host, registrable_domain(host)
+
+
+def candidate_hosts(host: str) -> List[str]:
+    """The host itself followed by its parent hosts, most specific first.
+
+    Bare top-level labels ("com") are never returned as parents, and IP
+    addresses only match themselves.
+    """
+    if not host:
+        return []
+    try:
+        ipaddress.ip_address(host)
+        return [host]
+    except ValueError:
+        pass
+    labels = host.split(".")
+    return [host] + [".".join(labels[i:]) for i in range(1, len(labels) - 1)]
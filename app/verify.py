@@ -0,0 +1,181 @@
+"""Vault integrity verification.
+
+Contract:
+- verify_vault(user_id, key, incremental=False, db_path=None, max_workers=None) -> VerifyReport
+
+Notes
+-----
+- Every vault token of the user is authenticated and decrypted with the key
+  (Fernet checks the HMAC before decrypting); failures are reported by row id
+  instead of being masked like in `services.list_passwords`.
+- Attachments are checked too: the Fernet file name and every AES-GCM chunk
+  (see `app.attachments`); failures are reported by attachment id.
+- Tokens and attachments are checked in batches on a process pool; small jobs
+  run inline to avoid the pool start-up cost. Attachment batches read their
+  chunks in the worker, so chunk data never passes through the parent.
+- SQLite's own check runs too: `PRAGMA integrity_check` for a full run,
+  `PRAGMA quick_check` for an incremental one.
+- Incremental mode re-verifies only rows whose change sequence (`seq`, see
+  `app.storage`) is newer than the last run, plus rows that were bad last time.
+  Attachments never change in place except on a re-key (which bumps the user's
+  seq), so only attachments added since the last run and previously bad ones
+  are re-checked, or all of them after a re-key. The last verified seq, highest
+  attachment id and bad ids are kept in the `meta` table per user.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from cryptography.fernet import Fernet
+
+from . import attachments, storage
+from .config import get_db_path
+
+BATCH_SIZE = 500
+
+
+@dataclass
+class VerifyReport:
+    checked: int = 0
+    bad: List[Dict[str, object]] = field(default_factory=list)  # {"id", "site", "error"}
+    checked_attachments: int = 0
+    bad_attachments: List[Dict[str, object]] = field(default_factory=list)  # {"attachment_id", "entry_id", "error"}
+    integrity: List[str] = field(default_factory=list)
+    incremental: bool = False
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.bad and not self.bad_attachments and self.integrity == ["ok"]
+
+
+def _check_batch(key: bytes, rows: Sequence[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    f = Fernet(key)
+    failures = []
+    for row_id, token in rows:
+        try:
+            f.decrypt(token.encode("utf-8")).decode("utf-8")
+        except Exception as ex:
+            failures.append((row_id, type(ex).__name__))
+    return failures
+
+
+def _check_attachment_batch(db_path: str, user_id: int, key: bytes, ids: Sequence[int]) -> List[Tuple[int, str]]:
+    return attachments.check_attachments(user_id, key, ids, Path(db_path))
+
+
+def _attachment_batches(rows: Sequence[Tuple[int, int]]) -> List[List[int]]:
+    # Group attachments so that a batch holds about BATCH_SIZE chunks
+    batches: List[List[int]] = []
+    current: List[int] = []
+    chunks = 0
+    for attachment_id, chunk_count in rows:
+        if current and chunks + chunk_count > BATCH_SIZE:
+            batches.append(current)
+            current, chunks = [], 0
+        current.append(attachment_id)
+        chunks += chunk_count
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _meta_key(user_id: int) -> str:
+    return f"verify:{user_id}"
+
+
+def verify_vault(
+    user_id: int,
+    key: bytes,
+    incremental: bool = False,
+    db_path: Optional[Path] = None,
+    max_workers: Optional[int] = None,
+) -> VerifyReport:
+    start = time.monotonic()
+    storage.ensure_db(db_path)
+    report = VerifyReport(incremental=incremental)
+    path = Path(db_path or get_db_path())
+    with sqlite3.connect(path) as conn:
+        report.integrity = [r[0] for r in conn.execute("PRAGMA quick_check" if incremental else "PRAGMA integrity_check")]
+
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (_meta_key(user_id),)).fetchone()
+        state = {"seq": 0, "bad": [], "attachment_id": 0, "bad_attachments": []}
+        if row:
+            state.update(json.loads(row[0]))
+        top = conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()
+        if incremental:
+            placeholders = ",".join("?" * len(state["bad"]))
+            extra = f" OR id IN ({placeholders})" if state["bad"] else ""
+            cur = conn.execute(
+                f"SELECT id, site, secret FROM vault WHERE user_id = ? AND (seq > ?{extra})",
+                (user_id, state["seq"], *state["bad"]),
+            )
+        else:
+            cur = conn.execute("SELECT id, site, secret FROM vault WHERE user_id = ?", (user_id,))
+        rows = cur.fetchall()
+        sites = {r[0]: r[1] for r in rows}
+        tokens = [(r[0], r[2]) for r in rows]
+        report.checked = len(tokens)
+
+        user_seq = conn.execute("SELECT seq FROM users WHERE id = ?", (user_id,)).fetchone()
+        rekeyed = user_seq is not None and (user_seq[0] or 0) > state["seq"]
+        if incremental and not rekeyed:
+            placeholders = ",".join("?" * len(state["bad_attachments"]))
+            extra = f" OR id IN ({placeholders})" if state["bad_attachments"] else ""
+            cur = conn.execute(
+                f"SELECT id, entry_id, chunk_count FROM attachments WHERE user_id = ? AND (id > ?{extra}) ORDER BY id",
+                (user_id, state["attachment_id"], *state["bad_attachments"]),
+            )
+        else:
+            cur = conn.execute("SELECT id, entry_id, chunk_count FROM attachments WHERE user_id = ? ORDER BY id", (user_id,))
+        attachment_rows = cur.fetchall()
+        entry_ids = {r[0]: r[1] for r in attachment_rows}
+        report.checked_attachments = len(attachment_rows)
+        last_attachment = conn.execute("SELECT MAX(id) FROM attachments WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+        jobs = [(_check_batch, (key, tokens[i:i + BATCH_SIZE])) for i in range(0, len(tokens), BATCH_SIZE)]
+        attachment_jobs = [
+            (_check_attachment_batch, (str(path), user_id, key, ids))
+            for ids in _attachment_batches([(r[0], r[2]) for r in attachment_rows])
+        ]
+        failures: List[Tuple[int, str]] = []
+        attachment_failures: List[Tuple[int, str]] = []
+        if len(jobs) + len(attachment_jobs) <= 1:
+            for fn, args in jobs:
+                failures.extend(fn(*args))
+            for fn, args in attachment_jobs:
+                attachment_failures.extend(fn(*args))
+        else:
+            workers = min(len(jobs) + len(attachment_jobs), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(fn, *args) for fn, args in jobs]
+                attachment_futures = [pool.submit(fn, *args) for fn, args in attachment_jobs]
+                for future in futures:
+                    failures.extend(future.result())
+                for future in attachment_futures:
+                    attachment_failures.extend(future.result())
+
+        report.bad = [{"id": row_id, "site": sites[row_id], "error": error} for row_id, error in sorted(failures)]
+        report.bad_attachments = [
+            {"attachment_id": attachment_id, "entry_id": entry_ids[attachment_id], "error": error}
+            for attachment_id, error in sorted(attachment_failures)
+        ]
+        state = {
+            "seq": int(top[0]) if top else 0,
+            "bad": [b["id"] for b in report.bad],
+            "attachment_id": last_attachment or 0,
+            "bad_attachments": [b["attachment_id"] for b in report.bad_attachments],
+        }
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (_meta_key(user_id), json.dumps(state))
+        )
+        conn.commit()
+    report.elapsed = time.monotonic() - start
+    return report
@@ -4,19 +4,30 @@ This launches a simple Tkinter GUI. Run as:
     python -m main
 or:
     python main.py
+
+Pass --profile-startup to print import/init timings up to the first drawn
+login window and exit. Crypto, storage and the vault frame load lazily.
 """
 from __future__ import annotations
 
 import sys
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if "--profile-startup" in args:
+        from app.startup import format_report, profile_startup
 
-try:
-    from app.gui import App
-except Exception as ex:
-    print(f"Failed to import application: {ex}")
-    sys.exit(1)
+        print(format_report(profile_startup()))
+        return 0
 
+    try:
+        from app.gui import App
+    except Exception as ex:
+        print(f"Failed to import application: {ex}")
+        return 1
 
-def main() -> int:
     app = App()
     app.mainloop()
     return 0
@@ -0,0 +1,86 @@
+from pathlib import Path
+import io
+import os
+import sqlite3
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app import attachments, storage
+
+
+def _setup(tmp_path: Path):
+    db = tmp_path / "test.db"
+    storage.init_db(db)
+    return db, Fernet.generate_key()
+
+
+def test_roundtrip_random_access_and_listing(tmp_path: Path):
+    db, key = _setup(tmp_path)
+    payload = os.urandom(10_000)
+    aid = attachments.add_attachment(1, key, "id_rsa", io.BytesIO(payload), db_path=db, chunk_size=1024)
+
+    meta = attachments.list_attachments(1, key, db_path=db)
+    assert meta == [{"id": aid, "entry_id": None, "name": "id_rsa", "size": 10_000, "created_at": meta[0]["created_at"]}]
+
+    with attachments.open_attachment(1, key, aid, db) as reader:
+        assert reader.chunk_count == 10
+        reader.seek(5000)
+        assert reader.read(3000) == payload[5000:8000]
+        reader.seek(-10, io.SEEK_END)
+        assert reader.read() == payload[-10:]
+
+    out = io.BytesIO()
+    assert attachments.export_attachment(1, key, aid, out, db) == 10_000
+    assert out.getvalue() == payload
+
+    empty = attachments.add_attachment(1, key, "empty", io.BytesIO(b""), db_path=db, chunk_size=1024)
+    assert attachments.open_attachment(1, key, empty, db).read() == b""
+
+
+def test_tampering_is_detected(tmp_path: Path):
+    db, key = _setup(tmp_path)
+    aid = attachments.add_attachment(1, key, "cert.pem", io.BytesIO(b"x" * 3000), db_path=db, chunk_size=1024)
+    with sqlite3.connect(db) as conn:
+        # Drop the final chunk and pretend the file was shorter
+        conn.execute("DELETE FROM attachment_chunks WHERE attachment_id = ? AND idx = 2", (aid,))
+        conn.execute("UPDATE attachments SET chunk_count = 2, size = 2048 WHERE id = ?", (aid,))
+    with pytest.raises(Exception):
+        attachments.open_attachment(1, key, aid, db).read()
+    with pytest.raises(ValueError):
+        attachments.open_attachment(2, key, aid, db)
+
+
+def test_deleting_entry_removes_attachments(tmp_path: Path):
+    db, key = _setup(tmp_path)
+    entry = storage.add_entry("example.com", "alice", "TOKEN", 1, db)
+    aid = attachments.add_attachment(1, key, "recovery.txt", io.BytesIO(b"codes"), entry_id=entry, db_path=db)
+    assert [a["id"] for a in attachments.list_attachments(1, key, entry_id=entry, db_path=db)] == [aid]
+    storage.delete_entry(entry, 1, db)
+    assert attachments.list_attachments(1, key, db_path=db) == []
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM attachment_chunks").fetchone()[0] == 0
+
+
+def test_reencrypt_for_new_master_key(tmp_path: Path):
+    db, key = _setup(tmp_path)
+    new_key = Fernet.generate_key()
+    aid = attachments.add_attachment(1, key, "notes.txt", io.BytesIO(b"y" * 2500), db_path=db, chunk_size=1024)
+    assert attachments.check_attachments(1, key, db_path=db) == []
+    with sqlite3.connect(db) as conn:
+        assert attachments.reencrypt_attachments(1, key, new_key, conn) == 1
+        conn.commit()
+    assert attachments.open_attachment(1, new_key, aid, db).read() == b"y" * 2500
+    with pytest.raises(Exception):
+        attachments.open_attachment(1, key, aid, db)
+
+
+@pytest.mark.parametrize("column, value", [("chunk_size", 2048), ("size", 100), ("size", 2500), ("chunk_count", 2)])
+def test_tampered_metadata_fails_instead_of_truncating(tmp_path: Path, column, value):
+    db, key = _setup(tmp_path)
+    aid = attachments.add_attachment(1, key, "a.bin", io.BytesIO(os.urandom(3000)), db_path=db, chunk_size=1024)
+    with sqlite3.connect(db) as conn:
+        conn.execute(f"UPDATE attachments SET {column} = ? WHERE id = ?", (value, aid))
+    with pytest.raises(ValueError):
+        with attachments.open_attachment(1, key, aid, db) as reader:
+            reader.read()
@@ -0,0 +1,85 @@
+from pathlib import Path
+import sqlite3
+import threading
+
+import pytest
+
+from app import backup, storage
+
+
+def _db(tmp_path: Path) -> Path:
+    db = tmp_path / "passwords.db"
+    storage.init_db(db)
+    uid = storage.create_user("alice", "Alice", "a@example.com", b"0123456789abcdef", "VERIFIER", db)
+    for i in range(500):
+        storage.add_entry(f"site{i}.com", "alice", "TOKEN" * 40, uid, db)
+    return db
+
+
+def test_snapshot_dedup_verify_restore(tmp_path: Path):
+    db = _db(tmp_path)
+    bdir = tmp_path / "backups"
+    s1 = backup.create_snapshot(db, bdir, chunk_pages=1)
+    assert s1.new_chunks == len(set(s1.chunks))
+
+    s2 = backup.create_snapshot(db, bdir, chunk_pages=1)
+    assert s2.new_chunks == 0
+
+    storage.add_entry("new.com", "alice", "NEW", 1, db)
+    s3 = backup.create_snapshot(db, bdir, chunk_pages=1)
+    assert 0 < s3.new_chunks < len(s3.chunks)
+
+    assert backup.verify_snapshot(s1.id, bdir) == []
+    target = tmp_path / "restored.db"
+    backup.restore_snapshot(s1.id, target, bdir)
+    assert len(storage.list_entries(1, target)) == 500
+
+    # Restore over an existing database
+    backup.restore_snapshot(s3.id, target, bdir)
+    assert len(storage.list_entries(1, target)) == 501
+
+
+def test_verify_detects_corruption_and_prune(tmp_path: Path):
+    db = _db(tmp_path)
+    bdir = tmp_path / "backups"
+    s1 = backup.create_snapshot(db, bdir)
+    storage.add_entry("new.com", "alice", "NEW", 1, db)
+    s2 = backup.create_snapshot(db, bdir)
+
+    assert backup.prune(keep=1, backup_dir=bdir) == 1
+    assert [s.id for s in backup.list_snapshots(bdir)] == [s2.id]
+    assert backup.verify_snapshot(s2.id, bdir) == []
+    with pytest.raises(ValueError):
+        backup.verify_snapshot(s1.id, bdir)
+
+    victim = next((bdir / "chunks").glob("*/*"))
+    victim.write_bytes(b"garbage")
+    assert backup.verify_snapshot(s2.id, bdir) != []
+    with pytest.raises(ValueError):
+        backup.restore_snapshot(s2.id, tmp_path / "out.db", bdir)
+
+    # A later snapshot rewrites the damaged chunk instead of reusing it
+    s3 = backup.create_snapshot(db, bdir)
+    assert s3.new_chunks == 1
+    assert backup.verify_snapshot(s3.id, bdir) == []
+    assert backup.verify_snapshot(s2.id, bdir) == []
+
+
+def test_prune_waits_for_snapshot_in_progress(tmp_path: Path):
+    db = _db(tmp_path)
+    bdir = tmp_path / "backups"
+    backup.create_snapshot(db, bdir)
+    storage.add_entry("new.com", "alice", "NEW", 1, db)
+
+    # Simulate a create that has stored its chunks but not yet its manifest
+    with backup._store_lock(bdir):
+        pruner = threading.Thread(target=backup.prune, kwargs={"keep": 1, "backup_dir": bdir})
+        pruner.start()
+        pruner.join(0.3)
+        assert pruner.is_alive()
+    pruner.join(5)
+    assert not pruner.is_alive()
+
+    s2 = backup.create_snapshot(db, bdir)
+    backup.prune(keep=1, backup_dir=bdir)
+    assert backup.verify_snapshot(s2.id, bdir) == []
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import threading
+import time
+
+import pytest
+
+from app import crypto, storage
+from app.login_scheduler import LoginBusyError, LoginScheduler, LoginThrottledError
+
+
+def _register(db: Path, username: str, password: str) -> int:
+    storage.init_db(db)
+    salt = crypto.generate_salt(16)
+    key = crypto.derive_key(password, salt)
+    return storage.create_user(username, "", "", salt, crypto.encrypt("verification", key), db)
+
+
+def test_login_on_process_pool_and_backoff(tmp_path: Path):
+    db = tmp_path / "test.db"
+    uid = _register(db, "alice", "Secret123456")
+    with LoginScheduler(max_workers=2, db_path=db, backoff_base=60) as sched:
+        user_id, key = sched.login("alice", "Secret123456")
+        assert user_id == uid
+        assert crypto.encrypt("x", key)
+
+        with pytest.raises(ValueError):
+            sched.login("alice", "wrong-password")
+        with pytest.raises(LoginThrottledError) as info:
+            sched.login("alice", "Secret123456")
+        assert info.value.retry_after > 0
+
+        m = sched.metrics()
+        assert m["completed"] == 1 and m["failed"] == 1 and m["throttled"] == 1
+        assert m["latency_p99"] > 0
+
+
+def test_admission_control_rejects_excess():
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.submit(release.wait)  # occupy the only worker
+    sched = LoginScheduler(max_workers=1, max_queue=1, executor=executor)
+
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(sched.derive_key("pw", b"salt"))) for _ in range(2)]
+    for t in waiters:
+        t.start()
+    deadline = time.monotonic() + 5
+    while sched.metrics()["in_flight"] < 2:
+        assert time.monotonic() < deadline, "derivations were not admitted"
+        time.sleep(0.01)
+    assert sched.metrics()["queue_depth"] == 1
+    with pytest.raises(LoginBusyError):
+        sched.derive_key("pw", b"salt")
+    release.set()
+    for t in waiters:
+        t.join()
+    assert len(results) == 2 and sched.metrics()["rejected"] == 1
+    sched.shutdown()
+
+
+def test_timed_out_jobs_keep_their_slot():
+    executor = ThreadPoolExecutor(max_workers=1)
+    sched = LoginScheduler(max_workers=1, max_queue=0, timeout=0.01, executor=executor)
+
+    # The full PBKDF2 run outlasts the timeout and cannot be cancelled once running
+    with pytest.raises(TimeoutError):
+        sched.derive_key("pw", b"salt")
+    m = sched.metrics()
+    assert m["in_flight"] == 1 and m["timeouts"] == 1 and m["latency_p99"] >= 0.01
+    with pytest.raises(LoginBusyError):
+        sched.derive_key("pw", b"salt")
+
+    executor.shutdown(wait=True)
+    assert sched.metrics()["in_flight"] == 0
+
+
+def test_failure_table_is_bounded(tmp_path: Path):
+    db = tmp_path / "test.db"
+    storage.init_db(db)
+    with LoginScheduler(max_workers=1, db_path=db, executor=ThreadPoolExecutor(1), max_tracked=3) as sched:
+        for i in range(10):
+            with pytest.raises(ValueError):
+                sched.login(f"random{i}", "pw")
+        assert list(sched._failures) == [(str(db), f"random{i}") for i in (7, 8, 9)]
+
+        # Quiet for twice the maximum backoff: forgotten on the next failure
+        sched.backoff_max = 0
+        with pytest.raises(ValueError):
+            sched.login("another", "pw")
+        assert list(sched._failures) == [(str(db), "another")]
+
+
+def test_broken_pool_is_replaced(tmp_path: Path):
+    db = tmp_path / "test.db"
+    _register(db, "alice", "Secret123456")
+    with LoginScheduler(max_workers=1, db_path=db) as sched:
+        assert sched.login("alice", "Secret123456")
+        for proc in list(sched._executor._processes.values()):
+            proc.kill()  # e.g. the OOM killer
+            proc.join(5)
+        for _ in range(2):
+            try:
+                sched.login("alice", "Secret123456")
+                break
+            except ValueError as ex:
+                assert "crashed" in str(ex)  # a login in flight when the pool broke
+        else:
+            pytest.fail("scheduler did not recover from a broken pool")
+        assert sched.metrics()["pool_restarts"] == 1
@@ -0,0 +1,156 @@
+from pathlib import Path
+import io
+import sqlite3
+import threading
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app import login_scheduler, storage, sync
+from app.session import VaultSession
+
+PASSWORD = "Secret123456"
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    # No backoff, so a deliberate wrong password does not throttle the next login
+    sched = login_scheduler.LoginScheduler(max_workers=1, backoff_base=0)
+    monkeypatch.setattr(login_scheduler, "_default", sched)
+    yield sched
+    sched.shutdown()
+
+
+def test_sessions_on_separate_vaults(tmp_path: Path):
+    a, b = tmp_path / "a.db", tmp_path / "b.db"
+    with VaultSession.register("alice", "Alice", "a@example.com", PASSWORD, a) as sa, \
+            VaultSession.register("bob", "Bob", "b@example.com", PASSWORD, b) as sb:
+        sa.add_password("example.com", "alice", "pw-a")
+        sb.add_password("example.com", "bob", "pw-b")
+        assert [e["password"] for e in sa.list_passwords()] == ["pw-a"]
+        assert [e["password"] for e in sb.list_passwords()] == ["pw-b"]
+        assert sa.get_user_profile()["full_name"] == "Alice"
+        assert sa.find_by_url("https://www.example.com/login")[0]["username"] == "alice"
+
+    assert sa.closed and sa.key == b""
+    with pytest.raises(ValueError):
+        sa.list_passwords()
+
+
+def test_cache_sees_other_connections_and_rekey(tmp_path: Path, scheduler):
+    db = tmp_path / "v.db"
+    VaultSession.register("alice", "", "", PASSWORD, db).close()
+    with VaultSession.login("alice", PASSWORD, db) as session:
+        entry = session.add_password("example.com", "alice", "pw1")
+        assert len(session.list_passwords()) == 1
+
+        # A write through another connection (e.g. a sync) invalidates the cache
+        storage.delete_entry(entry, session.user_id, db)
+        assert session.list_passwords() == []
+
+        session.add_password("other.org", "al", "pw2")
+        with pytest.raises(ValueError):
+            session.change_master_password("Wrong1234567", "NewSecret12345")
+        session.change_master_password(PASSWORD, "NewSecret12345")
+        assert session.list_passwords()[0]["password"] == "pw2"
+
+    with pytest.raises(ValueError):
+        VaultSession.login("alice", PASSWORD, db)
+    with VaultSession.login("alice", "NewSecret12345", db) as session:
+        assert session.list_passwords()[0]["password"] == "pw2"
+        assert session.verify().ok
+    # Logins were derived on the bounded pool
+    assert scheduler.metrics()["completed"] == 2 and scheduler.metrics()["failed"] == 1
+
+
+def test_rekey_is_atomic_when_an_attachment_is_corrupt(tmp_path: Path):
+    db = tmp_path / "v.db"
+    with VaultSession.register("alice", "", "", PASSWORD, db) as session:
+        session.add_password("example.com", "alice", "pw1")
+        good = session.add_attachment("a.txt", io.BytesIO(b"a" * 10))
+        bad = session.add_attachment("b.txt", io.BytesIO(b"b" * 10))
+        with sqlite3.connect(db) as conn:
+            conn.execute("UPDATE attachment_chunks SET data = ? WHERE attachment_id = ?", (b"\0" * 40, bad))
+
+        with pytest.raises(ValueError, match=f"Attachment {bad}"):
+            session.change_master_password(PASSWORD, "NewSecret12345")
+        assert session.list_passwords()[0]["password"] == "pw1"
+        assert session.open_attachment(good).read() == b"a" * 10
+
+    # Nothing was re-keyed: the old password still opens the vault
+    with VaultSession.login("alice", PASSWORD, db) as session:
+        assert session.list_passwords()[0]["password"] == "pw1"
+        assert session.open_attachment(good).read() == b"a" * 10
+
+
+def test_close_without_waiting_for_a_running_call(tmp_path: Path):
+    session = VaultSession.register("alice", "", "", PASSWORD, tmp_path / "v.db")
+    started, release = threading.Event(), threading.Event()
+
+    def busy():
+        with session._lock:  # stands in for a long call on the GUI worker
+            started.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=busy)
+    worker.start()
+    started.wait(5)
+    session.close(wait=False)  # returns at once
+    assert session.closed
+
+    release.set()
+    worker.join(5)
+    with pytest.raises(ValueError):
+        session.list_passwords()
+    deadline = time.monotonic() + 5
+    while session._conn is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert session._conn is None and session.key == b""
+
+
+def test_rekey_on_a_peer_then_sync_keeps_attachments_recoverable(tmp_path: Path):
+    a, b = tmp_path / "a.db", tmp_path / "b.db"
+    VaultSession.register("alice", "", "", PASSWORD, a).close()
+    storage.init_db(b)
+    sync.sync_databases(a, b)
+    with VaultSession.login("alice", PASSWORD, b) as session:
+        aid = session.add_attachment("b.txt", io.BytesIO(b"local"))
+
+    with VaultSession.login("alice", PASSWORD, a) as session:
+        session.change_master_password(PASSWORD, "NewSecret12345")
+    sync.sync_databases(a, b)
+
+    with VaultSession.login("alice", "NewSecret12345", b) as session:
+        with pytest.raises(ValueError, match="recover_attachments"):
+            session.change_master_password("NewSecret12345", "Another123456")
+        with pytest.raises(ValueError):
+            session.recover_attachments("Wrong1234567")
+        assert session.recover_attachments(PASSWORD) == 1
+        assert session.open_attachment(aid).read() == b"local"
+        assert session.verify().ok
+        session.change_master_password("NewSecret12345", "Another123456")
+        assert session.open_attachment(aid).read() == b"local"
+
+
+def test_plain_constructor_migrates_a_legacy_vault(tmp_path: Path):
+    db = tmp_path / "passwords.db"
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE vault (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,"
+                     " site TEXT NOT NULL, username TEXT NOT NULL, secret TEXT NOT NULL)")
+    conn.close()
+    key = Fernet.generate_key()
+    with VaultSession(1, key, db) as session:
+        session.add_password("example.com", "alice", "pw")
+        assert session.list_passwords()[0]["password"] == "pw"
+
+
+def test_attachment_and_verify_calls_need_an_open_session(tmp_path: Path):
+    session = VaultSession.register("alice", "", "", PASSWORD, tmp_path / "v.db")
+    aid = session.add_attachment("a.txt", io.BytesIO(b"data"))
+    assert session.list_attachments()[0]["name"] == "a.txt"
+    session.close()
+    for call in (session.verify, session.list_attachments, lambda: session.open_attachment(aid),
+                 lambda: session.add_attachment("b.txt", io.BytesIO(b""))):
+        with pytest.raises(ValueError, match="Session is closed"):
+            call()
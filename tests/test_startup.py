@@ -0,0 +1,52 @@
+from pathlib import Path
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app import config
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+
+def test_gui_import_does_not_load_crypto():
+    proc = _run("import sys, app.gui; print(sorted(m for m in ('cryptography', 'app.crypto', 'app.services') if m in sys.modules))")
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "[]"
+
+
+@pytest.fixture
+def display(monkeypatch):
+    """An X display for Tk: the current one, or a private Xvfb server on headless machines."""
+    if sys.platform != "linux" or os.environ.get("DISPLAY"):
+        yield
+        return
+    if shutil.which("Xvfb") is None:
+        pytest.skip("no display and Xvfb is not installed")
+    number = 90 + os.getpid() % 100
+    server = subprocess.Popen(["Xvfb", f":{number}", "-nolisten", "tcp"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    monkeypatch.setenv("DISPLAY", f":{number}")
+    deadline = time.monotonic() + 5
+    while not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+        assert server.poll() is None and time.monotonic() < deadline, "Xvfb did not start"
+        time.sleep(0.05)
+    yield
+    server.terminate()
+    server.wait(5)
+
+
+def test_time_to_first_window_budget(display):
+    proc = subprocess.run([sys.executable, "main.py", "--profile-startup"], cwd=ROOT, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert "heavy modules loaded before first window: none" in proc.stdout
+    match = re.search(r"time to first window\s+([\d.]+) ms", proc.stdout)
+    assert match, proc.stdout
+    assert float(match.group(1)) / 1000 < config.STARTUP_BUDGET_SECONDS
@@ -0,0 +1,102 @@
+from pathlib import Path
+import io
+import shutil
+import sqlite3
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app import attachments, storage, sync
+
+
+def _make_vault(path: Path, salt: bytes = b"0123456789abcdef") -> int:
+    storage.init_db(path)
+    return storage.create_user("alice", "Alice", "alice@example.com", salt, "VERIFIER", path)
+
+
+def test_two_way_sync_and_incremental(tmp_path: Path):
+    a, b = tmp_path / "a.db", tmp_path / "b.db"
+    ua = _make_vault(a)
+    storage.add_entry("example.com", "alice", "TOKEN_A", ua, a)
+    storage.init_db(b)
+
+    assert sync.sync_databases(a, b) == (0, 2)
+    ub = storage.get_user_by_username("alice", b)["id"]
+    storage.add_entry("other.org", "al", "TOKEN_B", ub, b)
+
+    assert sync.sync_databases(a, b) == (1, 0)
+    assert {it.secret for it in storage.list_entries(ua, a)} == {"TOKEN_A", "TOKEN_B"}
+    # Nothing changed since the last sync point: nothing is exchanged
+    assert len(sync.collect_changes(a, sync.get_replica_id(b), sync.get_sync_point(b, sync.get_replica_id(a)))) == 0
+    assert sync.sync_databases(a, b) == (0, 0)
+
+
+def test_delete_and_conflict_resolution(tmp_path: Path):
+    a, b = tmp_path / "a.db", tmp_path / "b.db"
+    ua = _make_vault(a)
+    rid = storage.add_entry("example.com", "alice", "T0", ua, a)
+    storage.init_db(b)
+    sync.sync_databases(a, b)
+    ub = storage.get_user_by_username("alice", b)["id"]
+    rid_b = storage.list_entries(ub, b)[0].id
+
+    storage.update_entry_secret(rid, "T_A", ua, a)
+    storage.update_entry_secret(rid_b, "T_B", ub, b)
+    sync.sync_databases(a, b)
+    assert storage.list_entries(ua, a)[0].secret == storage.list_entries(ub, b)[0].secret
+
+    key = Fernet.generate_key()
+    attachments.add_attachment(ua, key, "a.txt", io.BytesIO(b"data"), rid, a)
+    storage.delete_entry(rid_b, ub, b)
+    sync.sync_databases(a, b)
+    assert storage.list_entries(ua, a) == []
+    # The delete cascades to the entry's local attachments on the receiving side
+    assert attachments.list_attachments(ua, key, db_path=a) == []
+    with sqlite3.connect(a) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM attachment_chunks").fetchone()[0] == 0
+
+
+def test_salt_mismatch_and_copied_file(tmp_path: Path):
+    a, b = tmp_path / "a.db", tmp_path / "b.db"
+    _make_vault(a)
+    _make_vault(b, salt=b"fedcba9876543210")
+    with pytest.raises(ValueError):
+        sync.sync_databases(a, b)
+
+    c = tmp_path / "c.db"
+    shutil.copy(a, c)
+    with pytest.raises(ValueError):
+        sync.sync_databases(a, c)
+    sync.reset_replica_id(c)
+    assert sync.sync_databases(a, c) == (0, 0)
+    empty = tmp_path / "empty.db"
+    assert len(sync.collect_changes(empty)) == 0
+    assert sync.changeset_from_json(sync.changeset_to_json(sync.collect_changes(a))).users[0]["username"] == "alice"
+
+
+def test_upgraded_copies_of_legacy_vault_do_not_duplicate(tmp_path: Path):
+    legacy = tmp_path / "legacy.db"
+    with sqlite3.connect(legacy) as conn:
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL,"
+                     " full_name TEXT, email TEXT, salt BLOB NOT NULL, verifier TEXT NOT NULL)")
+        conn.execute("CREATE TABLE vault (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,"
+                     " site TEXT NOT NULL, username TEXT NOT NULL, secret TEXT NOT NULL)")
+        conn.execute("INSERT INTO users (username, salt, verifier) VALUES ('alice', x'00', 'V')")
+        for i in range(3):
+            conn.execute("INSERT INTO vault (user_id, site, username, secret) VALUES (1, ?, 'alice', ?)",
+                         (f"site{i}.com", f"T{i}"))
+    conn.close()
+    workstation, server = tmp_path / "workstation.db", tmp_path / "server.db"
+    shutil.copy(legacy, workstation)
+    shutil.copy(legacy, server)
+    storage.init_db(workstation)
+    storage.init_db(server)
+
+    assert sync.sync_databases(workstation, server) == (0, 0)
+    assert len(storage.list_entries(1, workstation)) == 3
+    assert len(storage.list_entries(1, server)) == 3
+
+    # Later edits on either side still propagate
+    storage.update_entry_secret(1, "NEW", 1, server)
+    assert sync.sync_databases(workstation, server) == (1, 0)
+    assert {it.secret for it in storage.list_entries(1, workstation)} == {"NEW", "T1", "T2"}
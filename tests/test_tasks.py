@@ -0,0 +1,55 @@
+import threading
+import time
+
+from app.gui.tasks import TaskRunner
+
+
+class FakeWidget:
+    """Stands in for a Tk widget: `after` callbacks are run by `pump`."""
+
+    def __init__(self):
+        self.calls = []
+
+    def after(self, ms, fn):
+        self.calls.append(fn)
+
+    def pump(self, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while self.calls and time.monotonic() < deadline:
+            self.calls.pop(0)()
+            time.sleep(0.005)
+
+
+def test_results_progress_and_errors_on_main_thread():
+    widget = FakeWidget()
+    runner = TaskRunner(widget)
+    main = threading.get_ident()
+    seen = []
+
+    def job(task):
+        for i in range(3):
+            task.progress(i + 1, 3)
+        return threading.get_ident()
+
+    runner.submit(job, on_success=lambda tid: seen.append(("done", tid != main, threading.get_ident() == main)),
+                  on_progress=lambda done, total: seen.append(("progress", done, total)))
+    runner.submit(lambda task: 1 / 0, on_error=lambda ex: seen.append(("error", type(ex).__name__)))
+    widget.pump()
+    assert seen == [("progress", 1, 3), ("progress", 2, 3), ("progress", 3, 3), ("done", True, True),
+                    ("error", "ZeroDivisionError")]
+    assert not runner.busy
+    runner.shutdown()
+
+
+def test_newer_task_with_same_tag_supersedes_older():
+    widget = FakeWidget()
+    runner = TaskRunner(widget)
+    gate = threading.Event()
+    results = []
+    runner.submit(lambda task: gate.wait(), tag="block")
+    runner.submit(lambda task: "stale", on_success=results.append, tag="refresh")
+    runner.submit(lambda task: "fresh", on_success=results.append, tag="refresh")
+    gate.set()
+    widget.pump()
+    assert results == ["fresh"]
+    runner.shutdown()
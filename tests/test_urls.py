@@ -0,0 +1,93 @@
+from pathlib import Path
+import sqlite3
+
+from app import storage, urls
+
+
+def test_normalize_and_registrable_domain():
+    assert urls.normalize_host("https://www.Example.com/login") == "example.com"
+    assert urls.normalize_host("Example.com") == "example.com"
+    assert urls.normalize_host("example.com:8443/path") == "example.com"
+    assert urls.site_keys("https://login.bank.co.uk/x") == ("login.bank.co.uk", "bank.co.uk")
+    assert urls.site_keys("http://192.168.1.10/admin") == ("192.168.1.10", "192.168.1.10")
+    assert urls.site_keys("Mi Banco") == ("mi banco", "mi banco")
+
+
+def test_find_by_domain_and_migration(tmp_path: Path):
+    db = tmp_path / "old.db"
+    # Database created before the site index existed
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE vault (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,"
+                     " site TEXT NOT NULL, username TEXT NOT NULL, secret TEXT NOT NULL)")
+        conn.execute("INSERT INTO vault (user_id, site, username, secret) VALUES (1, 'https://www.example.com/login', 'old', 'T0')")
+    storage.init_db(db)
+    storage.add_entry("accounts.example.com", "sub", "T1", 1, db)
+    storage.add_entry("Example.com", "plain", "T2", 1, db)
+    storage.add_entry("other.org", "x", "T3", 1, db)
+
+    host, domain = urls.site_keys("https://example.com/checkout")
+    found = storage.find_entries_by_domain(1, domain, host, db)
+    assert [it.username for it in found] == ["plain", "old", "sub"]
+    assert storage.find_entries_by_domain(2, domain, host, db) == []
+
+    with sqlite3.connect(db) as conn:
+        plan = " ".join(str(r) for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM vault WHERE user_id = 1 AND site_domain = 'example.com'"))
+    assert "idx_vault_user_domain" in plan
+
+
+def test_url_lookup_matches_host_or_parent_only(tmp_path: Path):
+    db = tmp_path / "v.db"
+    storage.init_db(db)
+    storage.add_entry("victim.github.io", "victim", "T1", 1, db)
+    storage.add_entry("shop.com.pl", "shop", "T2", 1, db)
+    storage.add_entry("myapp.herokuapp.com", "app", "T3", 1, db)
+    storage.add_entry("example.com", "parent", "T4", 1, db)
+    storage.add_entry("login.example.com", "exact", "T5", 1, db)
+    storage.add_entry("a.sibling.net", "sib", "T6", 1, db)
+
+    def users(url, **kw):
+        return [it.username for it in storage.find_entries_by_url(1, url, db_path=db, **kw)]
+
+    assert users("https://evil.github.io/") == []
+    assert users("https://victim.github.io/x") == ["victim"]
+    assert users("https://other.com.pl") == []
+    assert users("https://evil.herokuapp.com") == []
+    assert users("https://login.example.com/form") == ["exact", "parent"]
+    assert users("https://www.example.com") == ["parent"]
+    assert users("https://mail.example.com") == ["parent"]
+    assert users("https://example.com") == ["parent"]
+    # Registrable-domain grouping is opt-in and only used when no host matches
+    assert users("https://b.sibling.net") == []
+    assert users("https://b.sibling.net", match_domain=True) == ["sib"]
+    assert users("https://other.example.org") == []
+    assert users("https://store.shop.com.pl") == ["shop"]
+
+    with sqlite3.connect(db) as conn:
+        plan = " ".join(str(r) for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM vault WHERE user_id = 1 AND site_host IN ('a.example.com', 'example.com')"))
+    assert "idx_vault_user_host" in plan
+
+
+def test_candidate_hosts():
+    assert urls.candidate_hosts("a.b.example.com") == ["a.b.example.com", "b.example.com", "example.com"]
+    assert urls.candidate_hosts("example.com") == ["example.com"]
+    assert urls.candidate_hosts("10.0.0.1") == ["10.0.0.1"]
+    assert urls.candidate_hosts("") == []
+
+
+def test_migrations_run_once(tmp_path: Path, monkeypatch):
+    db = tmp_path / "v.db"
+    calls = []
+    init_db = storage.init_db
+    monkeypatch.setattr(storage, "init_db", lambda path=None: (calls.append(path), init_db(path)))
+    storage.ensure_db(db)
+    storage.ensure_db(db)
+    assert len(calls) == 1
+
+    # The site backfill is recorded, so a later init_db does not rescan the vault
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT value FROM meta WHERE key = 'site_index'").fetchone() == ("1",)
+        plan = " ".join(r[3] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM vault WHERE user_id = 1 AND site_host IN ('a.com', 'b.a.com')"))
+    assert "idx_vault_user_host" in plan
@@ -0,0 +1,80 @@
+from pathlib import Path
+import io
+import sqlite3
+
+from cryptography.fernet import Fernet
+
+from app import attachments, crypto, storage, verify
+
+
+def test_full_and_incremental_verification(tmp_path: Path, monkeypatch):
+    db = tmp_path / "test.db"
+    storage.init_db(db)
+    key, other = Fernet.generate_key(), Fernet.generate_key()
+    good = [storage.add_entry(f"s{i}.com", "u", crypto.encrypt("pw", key), 1, db) for i in range(5)]
+    bad = storage.add_entry("bad.com", "u", crypto.encrypt("pw", other), 1, db)
+    storage.add_entry("corrupt.com", "u", "not-a-token", 1, db)
+
+    report = verify.verify_vault(1, key, db_path=db)
+    assert report.checked == 7
+    assert report.integrity == ["ok"]
+    assert [b["id"] for b in report.bad] == [bad, bad + 1]
+    assert report.bad[0]["site"] == "bad.com" and not report.ok
+
+    # Only the changed row and the previously bad rows are re-verified
+    storage.update_entry_secret(good[0], crypto.encrypt("new", key), 1, db)
+    storage.update_entry_secret(bad, crypto.encrypt("fixed", key), 1, db)
+    report = verify.verify_vault(1, key, incremental=True, db_path=db)
+    assert report.checked == 3
+    assert [b["id"] for b in report.bad] == [bad + 1]
+
+    report = verify.verify_vault(1, key, incremental=True, db_path=db)
+    assert report.checked == 1
+
+    # Batches fan out to the process pool
+    monkeypatch.setattr(verify, "BATCH_SIZE", 2)
+    report = verify.verify_vault(1, key, db_path=db, max_workers=2)
+    assert report.checked == 7 and [b["id"] for b in report.bad] == [bad + 1]
+
+
+def test_attachments_are_verified_by_id(tmp_path: Path, monkeypatch):
+    db = tmp_path / "test.db"
+    storage.init_db(db)
+    key = Fernet.generate_key()
+    entry = storage.add_entry("s.com", "u", crypto.encrypt("pw", key), 1, db)
+    ok = attachments.add_attachment(1, key, "ok.bin", io.BytesIO(b"x" * 3000), entry, db, chunk_size=1024)
+    chunk = attachments.add_attachment(1, key, "chunk.bin", io.BytesIO(b"y" * 3000), None, db, chunk_size=1024)
+    name = attachments.add_attachment(1, key, "name.bin", io.BytesIO(b"z"), entry, db)
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE attachment_chunks SET data = ? WHERE attachment_id = ? AND idx = 1", (b"\0" * 40, chunk))
+        conn.execute("UPDATE attachments SET name = 'not-a-token' WHERE id = ?", (name,))
+
+    report = verify.verify_vault(1, key, db_path=db)
+    assert report.checked_attachments == 3 and report.bad == [] and not report.ok
+    assert [(b["attachment_id"], b["entry_id"]) for b in report.bad_attachments] == [(chunk, None), (name, entry)]
+
+    # Incremental runs re-check only new and previously bad attachments
+    attachments.delete_attachment(1, name, db)
+    report = verify.verify_vault(1, key, incremental=True, db_path=db)
+    assert report.checked_attachments == 1 and [b["attachment_id"] for b in report.bad_attachments] == [chunk]
+
+    # Attachment batches read and decrypt their chunks in the pool workers
+    monkeypatch.setattr(verify, "BATCH_SIZE", 2)
+    report = verify.verify_vault(1, key, db_path=db, max_workers=2)
+    assert report.checked_attachments == 2 and [b["attachment_id"] for b in report.bad_attachments] == [chunk]
+    assert ok not in [b["attachment_id"] for b in report.bad_attachments]
+
+
+def test_tampered_attachment_lengths_are_reported(tmp_path: Path):
+    db = tmp_path / "test.db"
+    storage.init_db(db)
+    key = Fernet.generate_key()
+    ids = [attachments.add_attachment(1, key, f"{i}.bin", io.BytesIO(b"x" * 3000), None, db, chunk_size=1024) for i in range(3)]
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE attachments SET chunk_size = 2048 WHERE id = ?", (ids[0],))
+        conn.execute("UPDATE attachments SET size = 2500 WHERE id = ?", (ids[1],))
+
+    report = verify.verify_vault(1, key, db_path=db)
+    assert not report.ok
+    assert [b["attachment_id"] for b in report.bad_attachments] == ids[:2]
+    assert {b["error"] for b in report.bad_attachments} == {"ValueError"}